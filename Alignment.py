@@ -0,0 +1,125 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import repeat
+
+from utils import date_str
+
+
+class Alignment(object):
+
+    """A common date axis for a set of stocks, with each stock's values
+    as an array aligned with it.
+
+    Stocks rarely have prices on exactly the same days (e.g. holidays
+    on one exchange only, or gaps in the data), so the axis and the
+    values on days a stock has no price depend on a policy:
+        - 'intersection': only days on which every stock has a price
+        - 'ffill': every day any stock has a price, with a stock's
+            last price carried forward on days it has none
+        - 'mask': every day any stock has a price, with NaN on days a
+            stock has none
+
+    There is no numpy here to align every stock in one vectorized
+    operation, so instead the work per stock is done by set operations
+    and by mapping the LUT's get over the axis, which run in C. Python
+    code only runs once per gap (to fill it), not once per day.
+
+    Attributes:
+        policy: The policy used, see POLICIES
+        dates: An array of dates for the axis, in chronological order
+        arrays: A map of tickers to arrays of floats aligned with dates
+        gaps: A map of tickers to arrays of the dates, out of every day
+            any stock has a price, on which the stock has none
+    """
+
+    POLICIES = ('intersection', 'ffill', 'mask')
+
+    def __init__(self, luts, policy='ffill', date_range=None,
+                 axis_tickers=None):
+        """Aligns a set of LUTs on a common date axis.
+
+        Args:
+            luts: A map of tickers to LUTs, i.e. dictionaries mapping
+                dates to values
+            policy: (optional) A policy, see POLICIES, default: 'ffill'
+            date_range: (optional) A tuple of (first, last) dates to
+                which to limit the axis
+            axis_tickers: (optional) An array of the tickers whose days
+                make up the axis, default: all of them
+        """
+        if policy not in Alignment.POLICIES:
+            raise ValueError('unknown alignment policy: {}'.format(policy))
+        self.policy = policy
+        if axis_tickers is None:
+            axis_tickers = list(luts.keys())
+        union = set({}).union(*[luts[ticker] for ticker in axis_tickers])
+        axis = sorted(union)
+        (first, last) = date_range or (None, None)
+        if first is not None:
+            axis = axis[bisect_left(axis, first):]
+        if last is not None:
+            axis = axis[:bisect_right(axis, last)]
+        if date_range:
+            union = set(axis)
+        self.gaps = {}
+        for (ticker, lut) in luts.items():
+            self.gaps[ticker] = sorted(union.difference(lut))
+        if policy == 'intersection':
+            self.dates = sorted(union.difference(
+                *[self.gaps[ticker] for ticker in axis_tickers]))
+        else:
+            self.dates = axis
+        self.arrays = {}
+        for (ticker, lut) in luts.items():
+            # with ffill, the dates are the union, so the gaps are
+            # exactly the dates to fill
+            self.arrays[ticker] = Alignment.align(
+                lut, self.dates, policy,
+                self.gaps[ticker] if policy == 'ffill' else None)
+
+    def summary(self):
+        """Describes the gaps of the aligned stocks.
+
+        Returns:
+            An array of strings, one per stock with gaps
+        """
+        action = {'intersection': 'dropped', 'ffill': 'filled',
+                  'mask': 'masked'}[self.policy]
+        return ['{}: {} date(s) without a price {}, {} to {}'.format(
+                    ticker, len(gaps), action, date_str(gaps[0]),
+                    date_str(gaps[-1]))
+                for (ticker, gaps) in sorted(self.gaps.items()) if gaps]
+
+    @staticmethod
+    def align(lut, dates, policy='ffill', gaps=None):
+        """Aligns a LUT with a date axis.
+
+        Args:
+            lut: A dictionary mapping dates to values
+            dates: An array of dates, in chronological order
+            policy: (optional) A policy, see POLICIES, default: 'ffill'
+            gaps: (optional) An array of the dates missing from the
+                LUT, in chronological order, if already known
+
+        Returns:
+            An array of floats aligned with the dates, NaN for dates
+            missing from the LUT unless the policy fills them
+        """
+        nan = float('nan')
+        values = array('d', list(map(lut.get, dates, repeat(nan))))
+        if policy != 'ffill' or not dates:
+            return values
+        if gaps is None:
+            gaps = sorted(set(dates).difference(lut))
+        if not gaps:
+            return values
+        last = nan
+        if gaps[0] == dates[0]:
+            earlier = max((date for date in lut.keys() if date < dates[0]),
+                          default=None)
+            if earlier is not None:
+                last = float(lut[earlier])
+        for date in gaps:
+            i = bisect_left(dates, date)
+            values[i] = values[i - 1] if i else last
+        return values
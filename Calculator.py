@@ -1,7 +1,19 @@
+import hashlib
 import time
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from operator import sub
 
 from utils import SteppedAvgLookup
+from utils import date_str
 from DataManager import DataManager
+from OnlineIndicator import OnlineEMA
+from OnlineIndicator import OnlineMACD
+from OnlineIndicator import OnlineMACDSignal
+from OnlineIndicator import OnlinePrevHigh
+from OnlineIndicator import OnlineSMA
+from PriceTable import PriceTable
 
 
 class Calculator(object):
@@ -17,7 +29,19 @@ class Calculator(object):
         'get_<indicator-name>' and 'get_<indicator-name>_series'. Then,
         in the get_indicator method, add the two methods to the correct
         mapping. Currently indicator getter functions need at least one
-        argument, even if a None will be passed.
+        argument, even if a None will be passed. An indicator computed
+        from other indicators also gets an entry in DEPENDENCIES (and
+        SERIES_DEPENDENCIES), and its getters take the values of those
+        indicators as extra arguments. For an online version, see
+        OnlineIndicator.
+
+    Indicators from get_indicator are memoized per price LUT, so
+    indicators shared by others (e.g. the EMAs of a MACD) are computed
+    once per LUT. A LUT is identified by the object itself, i.e. new
+    data for a stock must come as a new LUT, as for DataManager's
+    shared LUTs, which are never modified. With use_indicator_cache,
+    indicators of a ticker's prices are also kept on disk across
+    processes, keyed by a hash of the prices.
 
     Currently supports:
         - Standard Moving Average for a given period
@@ -29,10 +53,50 @@ class Calculator(object):
             including the current day)
     """
 
+    # indicators computed from other indicators, each mapped to a
+    # function of its period which returns the codes of the indicators
+    # it needs, in the order its getters take their values
+    DEPENDENCIES = {
+        'MACD': lambda periods: ['EMA_' + periods[0], 'EMA_' + periods[1]],
+        'MACDSIGNAL': lambda periods: ['MACD_' + '-'.join(periods)]
+    }
+    # the same, for the series getters
+    SERIES_DEPENDENCIES = {
+        'MACD': lambda periods: ['MACD_' + '-'.join(periods)],
+        'MACDSIGNAL': lambda periods: ['MACD_' + '-'.join(periods)]
+    }
+    # number of price LUTs to keep memoized indicators for
+    MEMO_LUTS = 4
+
     def __init__(self):
         """Initializes a Calculator."""
+        self._db = None
+        self._memo = OrderedDict()
+        self._cache_indicators = False
+
+    def use_data_manager(self, db):
+        """Sets the DataManager this Calculator should load and store
+        stock data with, e.g. one using a different storage backend.
+
+        Args:
+            db: A DataManager instance to use, if not set a default
+                DataManager is used
+        """
+        self._db = db
+
+    def use_indicator_cache(self, enabled=True):
+        """Sets whether this Calculator keeps the indicators it computes
+        for a ticker (see get_indicator) in the DataManager's indicator
+        cache on disk, so other processes computing the same indicator
+        from the same prices can read it back instead.
 
-    def get_indicator(self, indicator_code, price_lut, series=False):
+        Args:
+            enabled: (optional) A boolean for whether to use the cache
+        """
+        self._cache_indicators = enabled
+
+    def get_indicator(self, indicator_code, price_lut, series=False,
+                      ticker=None):
         """A mapping function for indicator functions. Primarily used
         for cases where indicators are dynamic and hardcoding functions
         is impractical.
@@ -40,22 +104,102 @@ class Calculator(object):
         Args:
             indicator_code: A string coding the indicator and period
             price_lut: A price lookup table for the data on which the
-                indicator should be applied
+                indicator should be applied, or a PriceTable whose
+                closing prices should be used
             series: A value for whether or not to map to a series
                 indicator function
+            ticker: (optional) The ticker whose prices are in the LUT,
+                needed to use the indicator cache (see
+                use_indicator_cache) for indicators which aren't series
+
+        Returns:
+            A dictionary mapping dates to indicator values, which is
+            shared with later calls for the same LUT, so it must not be
+            modified
+        """
+        if isinstance(price_lut, PriceTable):
+            price_lut = price_lut.lut('close')
+        results = self._memo_for(price_lut)
+        key = (indicator_code.upper(), series)
+        if key not in results:
+            if self._cache_indicators and ticker and not series:
+                results[key] = self._cached_indicator(indicator_code,
+                                                      price_lut, ticker)
+            else:
+                results[key] = self._compute_indicator(
+                    indicator_code, price_lut, series, ticker)
+        return results[key]
+
+    def _cached_indicator(self, indicator_code, price_lut, ticker):
+        """Internal function to read an indicator from the indicator
+        cache, or compute it and write it to the cache.
+
+        Args:
+            indicator_code: A string coding the indicator and period
+            price_lut: A price lookup table, keyed by date ordinals
+            ticker: The ticker whose prices are in the LUT
 
         Returns:
             A dictionary mapping dates to indicator values
         """
-        # decode
-        code_parts = indicator_code.split('_')
-        indicator = code_parts[0]
-        if len(code_parts) == 1:
-            period = None
+        db = self._db or DataManager()
+        price_hash = self._price_hash_for(price_lut)
+        indicator_lut = db.read_indicator_cache(ticker, indicator_code,
+                                                price_hash)
+        if indicator_lut is None:
+            indicator_lut = self._compute_indicator(indicator_code,
+                                                    price_lut, False, ticker)
+            db.write_indicator_cache(ticker, indicator_code, price_hash,
+                                     indicator_lut)
+        return indicator_lut
+
+    def _price_hash_for(self, price_lut):
+        """Internal function to hash the content of a price LUT, i.e.
+        its dates and prices. The hash is memoized with the LUT's
+        indicators.
+
+        Args:
+            price_lut: A price lookup table, keyed by date ordinals
+
+        Returns:
+            A 16 byte hash
+        """
+        results = self._memo_for(price_lut)
+        # memoized under a key no indicator has
+        if None not in results:
+            dates = array('q', sorted(price_lut.keys()))
+            digest = hashlib.blake2b(dates.tobytes(), digest_size=16)
+            digest.update(array('d', [price_lut[date]
+                                      for date in dates]).tobytes())
+            results[None] = digest.digest()
+        return results[None]
+
+    def _compute_indicator(self, indicator_code, price_lut, series,
+                           ticker=None):
+        """Internal function to compute an indicator, after getting
+        the indicators it depends on (see DEPENDENCIES) through
+        get_indicator.
+
+        Args:
+            indicator_code: A string coding the indicator and period
+            price_lut: A price lookup table
+            series: A value for whether or not to map to a series
+                indicator function
+            ticker: (optional) The ticker whose prices are in the LUT
+
+        Returns:
+            A dictionary mapping dates to indicator values, or a series
+        """
+        (indicator, period) = self._decode_indicator(indicator_code)
+        if series:
+            graph = Calculator.SERIES_DEPENDENCIES
         else:
-            period = code_parts[1].split('-')
-            if len(period) == 1:
-                period = period[0]
+            graph = Calculator.DEPENDENCIES
+        dependencies = []
+        if indicator in graph:
+            dependencies = [self.get_indicator(code, price_lut,
+                                               ticker=ticker)
+                            for code in graph[indicator](period)]
         # create mapping to methods
         if series:
             mapping = {
@@ -74,7 +218,102 @@ class Calculator(object):
                 'PREVHIGH': self.get_prev_high
             }
         # call correct method
-        return mapping[indicator](period, price_lut)
+        return mapping[indicator](period, price_lut, *dependencies)
+
+    def _memo_for(self, price_lut):
+        """Internal function to get the memoized indicators for a price
+        LUT, forgetting those of the least recently used LUT if there
+        are more than MEMO_LUTS.
+
+        Args:
+            price_lut: A price lookup table
+
+        Returns:
+            A dictionary mapping (indicator code, series) tuples to
+            indicators
+        """
+        entry = self._memo.get(id(price_lut))
+        # the entry holds on to its LUT, so the id can't be reused
+        if entry is None or entry[0] is not price_lut:
+            entry = (price_lut, {})
+            self._memo[id(price_lut)] = entry
+            while len(self._memo) > Calculator.MEMO_LUTS:
+                self._memo.popitem(last=False)
+        self._memo.move_to_end(id(price_lut))
+        return entry[1]
+
+    def get_online_indicator(self, indicator_code, price_lut=None):
+        """Returns an online version of an indicator, which is updated
+        one price at a time, see OnlineIndicator.
+
+        Args:
+            indicator_code: A string coding the indicator and period
+            price_lut: (optional) A price lookup table of the history
+                to start from
+
+        Returns:
+            An OnlineIndicator, whose value after each price equals the
+            value of get_indicator at that price's date
+        """
+        (indicator, period) = self._decode_indicator(indicator_code)
+        mapping = {
+            'SMA': OnlineSMA,
+            'EMA': OnlineEMA,
+            'MACD': OnlineMACD,
+            'MACDSIGNAL': OnlineMACDSignal,
+            'PREVHIGH': OnlinePrevHigh
+        }
+        online = mapping[indicator](period)
+        if price_lut:
+            online.update_all(price_lut[date]
+                              for date in sorted(price_lut.keys()))
+        return online
+
+    def get_lookback(self, indicator_code):
+        """Returns how many days of prices before a date an
+        indicator's value at that date depends on.
+
+        Only indicators for which a limited number of days gives
+        exactly the same value as the full history have a lookback.
+        Recursive indicators (e.g. EMA) depend on every price since
+        the start of the data.
+
+        Args:
+            indicator_code: A string coding the indicator and period
+
+        Returns:
+            A number of days, or None if the indicator depends on the
+            full history
+        """
+        (indicator, period) = self._decode_indicator(indicator_code)
+        mapping = {
+            'SMA': lambda period: int(period)
+        }
+        try:
+            return mapping[indicator](period)
+        except KeyError:
+            return None
+
+    def _decode_indicator(self, indicator_code):
+        """Decodes an indicator code into an indicator and period.
+
+        Args:
+            indicator_code: A string coding the indicator and period,
+                e.g. 'SMA_50' or 'MACD_12-26-9'
+
+        Returns:
+            A tuple of the indicator and its period, which is None,
+            a string, or a list of strings for multiple periods
+        """
+        code_parts = indicator_code.split('_')
+        indicator = code_parts[0]
+        if len(code_parts) == 1:
+            period = None
+        else:
+            period = code_parts[1].split('-')
+            if len(period) == 1:
+                period = period[0]
+        return (indicator, period)
 
     def get_sma(self, period, price_lut):
         """Calculates the Standard Moving Average for a given period
@@ -88,17 +327,9 @@ class Calculator(object):
         Returns:
             A dictionary with dates mapping to SMA values
         """
-        sma = {}
-        period = int(period)
         dates = sorted(price_lut.keys())
-        prices = []  # keep track of all prices as we go, for performance
-        for i, date in enumerate(dates):
-            prices.append(price_lut[date])
-            if i < period:
-                sma[date] = sum(prices) / len(prices)
-            else:
-                sma[date] = sum(prices[-period:]) / period
-        return sma
+        return dict(zip(dates, self._sma_values(
+            int(period), [price_lut[date] for date in dates])))
 
     def get_sma_series(self, period, price_lut):
         """Calculates the Standard Moving Average for a given period
@@ -113,16 +344,33 @@ class Calculator(object):
             A list with SMA values corresponding to ordered dates in
             the provided price LUT
         """
-        sma = []
-        period = int(period)
         dates = sorted(price_lut.keys())
-        prices = []  # keep track of all prices as we go, for performance
-        for i, date in enumerate(dates):
-            prices.append(price_lut[date])
-            if i < period:
-                sma.append(sum(prices) / len(prices))
-            else:
-                sma.append(sum(prices[-period:]) / period)
+        return self._sma_values(int(period),
+                                [price_lut[date] for date in dates])
+
+    def _sma_values(self, period, prices):
+        """Internal function to calculate the Standard Moving Average
+        of an array of prices, in O(n) regardless of the period.
+
+        The sum of the window is kept as a running sum, adding the
+        price entering it and subtracting the one leaving it, so each
+        price is only visited twice. Until the window is full, the
+        average is of all prices so far.
+
+        Args:
+            period: A number of prices to average
+            prices: An array of prices, in chronological order
+
+        Returns:
+            A list of SMA values aligned with the prices
+        """
+        head = list(accumulate(prices[:period]))
+        sma = [total / count for (count, total) in enumerate(head, 1)]
+        if len(prices) > period:
+            totals = accumulate(map(sub, prices[period:], prices),
+                                initial=head[-1])
+            next(totals)
+            sma.extend(total / period for total in totals)
         return sma
 
     def get_ema(self, period, price_lut):
@@ -171,7 +419,8 @@ class Calculator(object):
                        + ema[-1] * (1 - multiplier))
         return ema
 
-    def get_macd(self, periods, price_lut):
+    def get_macd(self, periods, price_lut, macd_short=None,
+                 macd_long=None):
         """Calculates the Moving Average Convergence/Divergence for a
         given period and returns a dictionary mapping dates to MACD.
 
@@ -180,6 +429,10 @@ class Calculator(object):
                 MACD period, i.e. [short, long, exponential/signal]
             price_lut: A set of values on which to perform the MACD
                 calculations
+            macd_short: (optional) The EMA for the short period, if
+                already calculated
+            macd_long: (optional) The EMA for the long period, if
+                already calculated
 
         Returns:
             A dictionary mapping dates to MACD values
@@ -189,8 +442,10 @@ class Calculator(object):
         # signal = {}
         # histogram = {}
         dates = sorted(price_lut.keys())
-        macd_short = self.get_ema(periods[0], price_lut)
-        macd_long = self.get_ema(periods[1], price_lut)
+        if macd_short is None:
+            macd_short = self.get_ema(periods[0], price_lut)
+        if macd_long is None:
+            macd_long = self.get_ema(periods[1], price_lut)
         # calculate MACD first - needed for signal and histogram
         for date in dates:
             macd[date] = macd_short[date] - macd_long[date]
@@ -205,7 +460,7 @@ class Calculator(object):
         #     ret[date] = [macd[date], signal[date], histogram[date]]
         # return ret
 
-    def get_macd_signal(self, periods, price_lut):
+    def get_macd_signal(self, periods, price_lut, macd=None):
         """Calculates the signal line for the Moving Average
         Convergence/Divergence for a given set of periods and returns a
         dictionary mapping dates to signal line values.
@@ -215,20 +470,18 @@ class Calculator(object):
                 MACD period, i.e. [short, long, exponential/signal]
             price_lut: A set of values on which to perform the MACD
                 calculations
+            macd: (optional) The MACD for the periods, if already
+                calculated
 
         Returns:
             A dictionary mapping dates to MACD signal values
         """
-        macd = {}
-        dates = sorted(price_lut.keys())
-        macd_short = self.get_ema(periods[0], price_lut)
-        macd_long = self.get_ema(periods[1], price_lut)
         # calculate MACD first - needed for signal
-        for date in dates:
-            macd[date] = macd_short[date] - macd_long[date]
+        if macd is None:
+            macd = self.get_macd(periods, price_lut)
         return self.get_ema(periods[2], macd)
 
-    def get_macd_series(self, periods, price_lut):
+    def get_macd_series(self, periods, price_lut, macd=None):
         """Calculates the Moving Average Convergence/Divergence for a
         given period and returns lists for MACD, signal, and histogram.
 
@@ -237,21 +490,20 @@ class Calculator(object):
                 MACD period
             price_lut: A set of values on which to perform the MACD
                 calculations
+            macd: (optional) The MACD for the periods, if already
+                calculated
 
         Returns:
             A set of sets of values for the MACD, signal line, and MACD
             histogram at each point for the given values, i.e. a set in
             the form [[MACD], [signal line], [MACD histogram]]
         """
-        macd = {}
         signal = []
         histogram = []
         dates = sorted(price_lut.keys())
-        macd_short = self.get_ema(periods[0], price_lut)
-        macd_long = self.get_ema(periods[1], price_lut)
         # calculate MACD first - needed for signal and histogram
-        for date in dates:
-            macd[date] = macd_short[date] - macd_long[date]
+        if macd is None:
+            macd = self.get_macd(periods, price_lut)
         # calculate signal - needed for histogram
         signal = self.get_ema_series(periods[2], macd)
         # calculate histogram
@@ -339,7 +591,7 @@ class Calculator(object):
             latter is intended to be used for verifying generation
             accuracy against existing real data.
         """
-        db = DataManager()
+        db = self._db or DataManager()
         # get prices for tickers
         price_lut_tgt = db.build_price_lut(ticker_tgt)
         price_lut_src = db.build_price_lut(ticker_src)
@@ -414,7 +666,7 @@ class Calculator(object):
             price_lut_gen_part[src_dates[i]] = gen_price
         # save data to disk for faster retrieval next time
         db.write_stock_data(ticker_tgt + '--GEN-FULL',
-                            [[date,
+                            [[date_str(date),
                               '-',
                               '-',
                               '-',
@@ -422,7 +674,7 @@ class Calculator(object):
                               '-'] for date in src_dates],
                             False)
         db.write_stock_data(ticker_tgt + '--GEN-PART',
-                            [[date,
+                            [[date_str(date),
                               '-',
                               '-',
                               '-',
@@ -1,12 +1,54 @@
 import errno
+import gzip
+import json
+import lzma
+import mmap
 import os
 import os.path
 import datetime
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from itertools import repeat
+
+from PriceTable import PriceTable
+from utils import SizedLRUCache
+from utils import date_ordinal
+from utils import date_str
+from utils import date_strs_for
 
 
 class DataManager(object):
 
     DATE_FORMAT = '%Y-%m-%d'
+    COLUMNS = PriceTable.COLUMNS
+    # binary cache header: magic, byte order, CSV mtime, CSV size, rows
+    CACHE_HEADER = struct.Struct('<4scqqq')
+    CACHE_MAGIC = b'PBC1'
+    BACKENDS = ('csv', 'sqlite')
+    # CSV file extensions for each compression, and how to open them
+    EXTENSIONS = {None: '.csv', 'gzip': '.csv.gz', 'lzma': '.csv.xz'}
+    OPENERS = {'.csv': open, '.csv.gz': gzip.open, '.csv.xz': lzma.open}
+    SQLITE_FILENAME = 'stocks.db'
+    MANIFEST_DIRNAME = 'manifest'
+    INTRADAY_DIRNAME = 'intraday'
+    # indicator cache header: magic, byte order, price hash, data
+    # checksum, rows
+    INDICATOR_HEADER = struct.Struct('<4sc16sqq')
+    INDICATOR_MAGIC = b'PIC1'
+    INDICATOR_DIRNAME = 'indicators'
+    # intraday partitions, and the length of the timestamp prefix
+    # naming each partition's file
+    PARTITIONS = {'day': 10, 'month': 7}
+    # price LUTs shared by every DataManager in this process
+    price_cache = SizedLRUCache(256 * 1024 * 1024)
+    # (indicator dir, data checksum) pairs already swept of stale
+    # indicators by this process
+    swept_indicators = set()
 
     """A DataManager is responsible for managing (i.e. storing and
     retrieving) data on disk.
@@ -18,9 +60,59 @@ class DataManager(object):
     wrappers for low level or commonly used and simple, but ugly to
     write actions.
 
+    Parsed CSV files are cached in a binary columnar format (dates as
+    ordinals, then one float64 array per OHLCV column) in a cache
+    directory. A cached file is rebuilt whenever the modification time
+    or size of its CSV file changes. Built price LUTs are also kept in
+    memory in price_cache, which is shared by all instances, so loading
+    the same ticker again in the same process is free.
+
+    CSV files may be gzip (.csv.gz) or lzma (.csv.xz) compressed, which
+    is picked up from the file extension when reading or appending, so
+    compressed and plain files can be mixed in the data location. New
+    files are written with the compression the DataManager was created
+    with.
+
+    A manifest with the row count, first and last date and a checksum
+    of each ticker's data is updated on every write (and rebuilt for
+    files changed by other means), so questions like which dates a
+    ticker covers can be answered without reading its data. Each
+    ticker's entry is a small JSON file of its own in a manifest
+    directory, so writing one entry takes the same time however many
+    tickers there are, and concurrent writers of different tickers
+    don't overwrite each other's entries.
+
+    With the 'sqlite' backend, all stock data is instead stored in a
+    single SQLite database in the data location, with a (ticker, date)
+    primary key, so reads limited to a date range only fetch the rows
+    in that range. Both backends have the same interface.
+
+    Intraday bars (e.g. minute bars) are stored separately, as one CSV
+    file per ticker per day or month in an intraday directory, with
+    'YYYY-MM-DD HH:MM[:SS]' timestamps instead of dates. They can be
+    read back one partition at a time, so no more than a partition of
+    bars needs to be in memory.
+
+    Indicators computed from a ticker's prices can be cached in the
+    cache directory too, one binary file per ticker, indicator and
+    hash of the prices (see Calculator.use_indicator_cache). Each entry
+    records the manifest checksum of the ticker's data when it was
+    written, and entries from before the data changed are removed, at
+    most once per ticker and checksum per process.
+
+    The binary cache, the manifest and the indicator cache are purely
+    optimizations, rebuilt from the stock data whenever they're missing
+    or out of date, so failing to write any of them is ignored.
+
     Attributes:
         data_location: A string indicating where the stock data is
             stored on disk
+        backend: A string indicating how the stock data is stored,
+            either 'csv' (one CSV file per ticker) or 'sqlite'
+        compression: A string indicating how new CSV files are
+            compressed, either None, 'gzip' or 'lzma'
+        cache_location: A string indicating where the binary columnar
+            cache of the stock data is stored on disk
 
     Todo:
         - [code improvement, low priority] create independent market
@@ -31,15 +123,48 @@ class DataManager(object):
             columns to return map
     """
 
-    def __init__(self, data_location='data/'):
+    def __init__(self, data_location='data/', cache_location=None,
+                 backend='csv', compression=None):
         """Inits DataManager with a data location.
 
         Args:
             data_location: (optional) A string representing where the
                 data dir will be on disk, default: ./data/
+            cache_location: (optional) A string representing where the
+                binary cache dir will be on disk, default: cache/
+                inside the data dir
+            backend: (optional) A string representing how stock data
+                is stored, one of BACKENDS, default: 'csv'
+            compression: (optional) A string representing how to
+                compress new CSV files, 'gzip' or 'lzma', default: None
         """
+        if backend not in DataManager.BACKENDS:
+            raise ValueError('unknown backend: {}'.format(backend))
+        if compression not in DataManager.EXTENSIONS:
+            raise ValueError('unknown compression: {}'.format(compression))
         self.data_location = data_location
+        if cache_location is None:
+            cache_location = self.data_location + 'cache/'
+        self.cache_location = cache_location
+        self.backend = backend
+        self.compression = compression
         os.makedirs(self.data_location, exist_ok=True)
+        self._checksums = {}
+        self._local = threading.local()
+        if self.backend == 'sqlite':
+            self._sqlite()
+
+    def __getstate__(self):
+        """Returns the state to pickle, e.g. to send this DataManager
+        to a worker process, without open database connections."""
+        state = dict(self.__dict__)
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        """Restores a pickled DataManager."""
+        self.__dict__.update(state)
+        self._local = threading.local()
 
     def write_stock_data(self, ticker, data, append):
         """Writes an array of data to a file on disk.
@@ -49,19 +174,18 @@ class DataManager(object):
             data: An array in [[date,open,high,low,close,volume],...]
                 format
             append: A boolean representing whether or not to append to
-                existing data
+                existing data. Only rows after the last date on disk
+                are appended, and only if the data overlaps it
         """
+        if self.backend == 'sqlite':
+            self._write_data_to_sqlite(ticker, data, append)
+            return
         data_to_write = []
+        manifest_entry = None
         if append:
             mode = 'a'
-            existing_data = self.read_stock_data(ticker, 'row')
-            if len(existing_data) == 0:
-                data_to_write = data
-            elif (existing_data[-1][0] < data[-1][0] and
-                  existing_data[-1][0] > data[0][0]):
-                index_of_last = next(i for i, _ in enumerate(data)
-                                     if _[0] == existing_data[-1][0])
-                data_to_write = data[index_of_last + 1:]
+            manifest_entry = self.read_manifest(ticker)
+            data_to_write = self._data_to_append_for(ticker, data)
         else:
             mode = 'w'
             data_to_write = data
@@ -69,6 +193,12 @@ class DataManager(object):
                 self._remove_file_for(ticker)
         self._write_data_to_csv_file(
             self._filename_for(ticker), data_to_write, mode)
+        manifest_entry = self._manifest_entry_after_write(
+            manifest_entry, data_to_write)
+        stat = os.stat(self._filename_for(ticker))
+        manifest_entry['mtime'] = stat.st_mtime_ns
+        manifest_entry['size'] = stat.st_size
+        self._save_manifest_entry(ticker, manifest_entry)
 
     def read_stock_data(self, ticker, format):
         """Retrieves stock data for a given ticker in a given format
@@ -83,13 +213,66 @@ class DataManager(object):
             An array in either row or column format contaning the data
                 for a given stock
         """
+        if self.backend == 'sqlite':
+            rows = self._read_sqlite_rows_for(ticker)
+            if format == 'column':
+                return [list(column) for column in zip(*rows)] \
+                    or [[] for i in range(0, 6)]
+            if format == 'row':
+                return rows
+            return []
         if format == 'column':
             return self._read_csv_file_columns_for(ticker)
         if format == 'row':
             return self._read_csv_file_rows_for(ticker)
         return []
 
-    def build_price_lut(self, ticker, fill=True):
+    def read_manifest(self, ticker):
+        """Returns the manifest entry for a given ticker, without
+        reading its data unless the entry is missing or out of date.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A dictionary with the number of 'rows', the 'first' and
+            'last' dates, a CRC-32 'checksum' of the rows as CSV text,
+            and the 'mtime' and 'size' of the file (None for the
+            sqlite backend), or None if there is no data for the ticker
+        """
+        ticker = ticker.upper()
+        if self.backend == 'sqlite':
+            return self._read_sqlite_manifest_for(ticker)
+        if not self._has_file_for(ticker):
+            return None
+        stat = os.stat(self._filename_for(ticker))
+        entry = self._load_manifest_entry(ticker)
+        if (entry is None or entry['mtime'] != stat.st_mtime_ns
+                or entry['size'] != stat.st_size):
+            entry = self._manifest_entry_after_write(
+                None, self._read_csv_file_rows_for(ticker))
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            self._save_manifest_entry(ticker, entry)
+        return entry
+
+    def get_date_range(self, ticker):
+        """Returns the first and last date of the data for a given
+        ticker, using the manifest.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A tuple of (first, last) date strings, which are None if
+            there is no data for the ticker
+        """
+        entry = self.read_manifest(ticker)
+        if entry is None:
+            return (None, None)
+        return (entry['first'], entry['last'])
+
+    def build_price_lut(self, ticker, fill=True, date_range=None):
         """Builds a price look up table for a given ticker.
 
         Args:
@@ -98,38 +281,469 @@ class DataManager(object):
                 previous data
                 NOTE: experimental feature which made some slightly
                 unexpected numbers come up - turned off for now
+            date_range: (optional) A tuple of (start, end) dates to
+                limit the table to, either of which may be None. The
+                result is the same as the full table limited to the
+                range, but only the rows needed are read
 
         Returns:
-            A dictionary with dates as keys and prices as values
+            A dictionary with date ordinals as keys and prices as
+            values. The dictionary is shared through price_cache, so it
+            must not be modified
+        """
+        return self.build_price_luts([ticker], fill, date_range)[0]
+
+    def build_price_luts(self, tickers, fill=True, date_range=None,
+                         executor=None):
+        """Builds price look up tables for a number of tickers, see
+        build_price_lut. Only the LUTs missing from price_cache are
+        built, possibly concurrently by an executor, and they're added
+        to price_cache in this process, even if built in other ones.
+
+        Args:
+            tickers: An array of strings representing the tickers of
+                stocks
+            fill: Whether or not to fill holidays/weekends with
+                previous data, same as in build_price_lut
+            date_range: (optional) A tuple of (start, end) dates to
+                limit the tables to, same as in build_price_lut
+            executor: (optional) A concurrent.futures Executor, e.g. a
+                ProcessPoolExecutor, with which to build the missing
+                LUTs, default: build them one after another
+
+        Returns:
+            An array of dictionaries with date ordinals as keys and
+            prices as values, in the same order as the tickers. The
+            dictionaries are shared through price_cache, so they must
+            not be modified
+        """
+        price_lookups = [{} for ticker in tickers]
+        keys = {}
+        for (i, ticker) in enumerate(tickers):
+            if not self._has_data_for(ticker):
+                continue
+            key = ('lut',) + self._price_cache_key_for(ticker, fill,
+                                                       date_range)
+            price_lookups[i] = DataManager.price_cache.get(key)
+            if price_lookups[i] is None:
+                keys[i] = key
+        missing = list(keys.keys())
+        # only the missing LUTs are sent to (and back from) the executor
+        build = executor.map if executor else map
+        built = build(self._build_price_lut, [tickers[i] for i in missing],
+                      repeat(fill), repeat(date_range))
+        for (i, price_lookup) in zip(missing, built):
+            DataManager.price_cache.put(keys[i], price_lookup)
+            price_lookups[i] = price_lookup
+        return price_lookups
+
+    def _build_price_lut(self, ticker, fill, date_range=None):
+        """Builds a price look up table for a given ticker, bypassing
+        price_cache.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            fill: Whether or not to fill holidays/weekends with
+                previous data
+            date_range: (optional) A tuple of (start, end) dates
+
+        Returns:
+            A dictionary with date ordinals as keys and prices as values
         """
         price_lookup = {}
-        file_content = self._readlines_for(ticker)
-        # handle corner cases with empty or single-line files
-        if len(file_content) == 0:
+        table = self._read_table_for(ticker, date_range)
+        dates = table.dates
+        prices = table.column('close')
+        # fill each row's span of calendar days by date ordinal
+        for (i, span) in self._row_spans(dates, fill):
+            if span == 1:
+                price_lookup[dates[i]] = prices[i]
+            else:
+                price_lookup.update(zip(range(dates[i], dates[i] + span),
+                                        repeat(prices[i], span)))
+        if date_range:
+            (first, last) = self._date_range_ordinals(date_range)
+            price_lookup = {date: price for (date, price)
+                            in price_lookup.items() if first <= date <= last}
+        return price_lookup
+
+    def build_price_table(self, ticker, fill=True, date_range=None):
+        """Builds a table of all OHLCV columns for a given ticker.
+
+        The table has the same dates as the price LUT built by
+        build_price_lut with the same arguments, with every column
+        stored as a contiguous array of floats. Filled holidays/weekends
+        are flat bars at the previous close with no volume, so no
+        traded volume or range is counted twice.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            fill: Whether or not to fill holidays/weekends with
+                previous data
+            date_range: (optional) A tuple of (start, end) dates to
+                limit the table to, same as in build_price_lut
+
+        Returns:
+            A PriceTable for the given ticker. The table is shared
+            through price_cache, so it must not be modified
+        """
+        if not self._has_data_for(ticker):
+            return PriceTable()
+        key = ('table',) + self._price_cache_key_for(ticker, fill,
+                                                     date_range)
+        table = DataManager.price_cache.get(key)
+        if table is None:
+            table = self._build_price_table(ticker, fill, date_range)
+            DataManager.price_cache.put(key, table)
+        return table
+
+    def _build_price_table(self, ticker, fill, date_range=None):
+        """Builds a table of all OHLCV columns for a given ticker,
+        bypassing price_cache.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            fill: Whether or not to fill holidays/weekends with
+                previous data
+            date_range: (optional) A tuple of (start, end) dates
+
+        Returns:
+            A PriceTable for the given ticker
+        """
+        raw = self._read_table_for(ticker, date_range)
+        dates = array('q')
+        rows = []
+        # whether each day is the row's own date rather than a filled one
+        traded = []
+        for (i, span) in self._row_spans(raw.dates, fill):
+            dates.extend(range(raw.dates[i], raw.dates[i] + span))
+            rows.extend(repeat(i, span))
+            traded.append(True)
+            traded.extend(repeat(False, span - 1))
+        closes = raw.column('close')
+        columns = {'close': array('d', [closes[i] for i in rows])}
+        for name in ('open', 'high', 'low'):
+            values = raw.column(name)
+            columns[name] = array('d', [values[i] if own else closes[i]
+                                        for (i, own) in zip(rows, traded)])
+        volumes = raw.column('volume')
+        columns['volume'] = array('d', [volumes[i] if own else 0.0
+                                        for (i, own) in zip(rows, traded)])
+        table = PriceTable(dates, columns)
+        if date_range:
+            (first, last) = self._date_range_ordinals(date_range)
+            table = table.slice(bisect_right(dates, first - 1),
+                                bisect_right(dates, last))
+        return table
+
+    def _row_spans(self, dates, fill):
+        """Decides which rows of a file make it into a price LUT or
+        table, and how many days each of them covers.
+
+        A row covers the days up to the next row's date, or only its
+        own date if not filling. Rows followed by a row which isn't
+        later are skipped, while the last row is always kept.
+
+        Args:
+            dates: An array of date ordinals, one per row of a file
+            fill: Whether or not to fill holidays/weekends with
+                previous data
+
+        Returns:
+            An array of (row index, number of days) tuples
+        """
+        spans = []
+        for i in range(0, len(dates) - 1):
+            span = dates[i + 1] - dates[i]
+            if span > 0:
+                spans.append((i, span if fill else 1))
+        if len(dates):
+            spans.append((len(dates) - 1, 1))
+        return spans
+
+    def write_intraday_data(self, ticker, data, partition='day'):
+        """Writes an array of intraday bars to disk, in one file per
+        day or month. Bars are merged into the existing partitions,
+        replacing existing bars with the same timestamps.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            data: An array in [[timestamp,open,high,low,close,volume],
+                ...] format
+            partition: (optional) A string representing how to
+                partition the bars, one of PARTITIONS, default: 'day'.
+                A ticker's bars must all be partitioned the same way
+        """
+        if partition not in DataManager.PARTITIONS:
+            raise ValueError('unknown partition: {}'.format(partition))
+        length = DataManager.PARTITIONS[partition]
+        partitions = self.get_intraday_partitions(ticker)
+        if partitions and len(partitions[0]) != length:
+            raise ValueError('intraday data for {} is not partitioned by '
+                             '{}'.format(ticker.upper(), partition))
+        os.makedirs(self._intraday_dir_for(ticker), exist_ok=True)
+        groups = {}
+        for row in data:
+            groups.setdefault(row[0][:length], []).append(row)
+        for (key, rows) in groups.items():
+            filename = self._intraday_filename_for(ticker, key)
+            merged = {}
+            if self._has_file(filename):
+                with self._open_file(filename, 'r') as file:
+                    for line in file:
+                        row = [value.strip() for value in line.split(',')]
+                        merged[row[0]] = row
+            for row in rows:
+                merged[row[0]] = row
+            extension = filename[len(self._intraday_dir_for(ticker))
+                                 + len(key):]
+            with DataManager.OPENERS[extension](
+                    self._temp_filename_for(filename), 'wt') as file:
+                file.write(self._csv_text_for(
+                    [merged[timestamp] for timestamp in sorted(merged)]))
+            os.replace(file.name, filename)
+
+    def get_intraday_partitions(self, ticker, date_range=None):
+        """Returns the partitions of a ticker's intraday bars.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            date_range: (optional) A tuple of (first, last) dates, either
+                of which may be None, to which to limit the partitions
+
+        Returns:
+            A sorted array of partition names, i.e. 'YYYY-MM-DD' dates
+            or 'YYYY-MM' months
+        """
+        (first, last) = self._date_range_strs(date_range)
+        directory = self._intraday_dir_for(ticker)
+        if not os.path.isdir(directory):
+            return []
+        partitions = set({})
+        for name in os.listdir(directory):
+            if name.endswith('.tmp'):
+                continue
+            key = name.split('.')[0]
+            if first[:len(key)] <= key <= last[:len(key)]:
+                partitions.add(key)
+        return sorted(partitions)
+
+    def build_intraday_lut(self, ticker, partition, date_range=None):
+        """Builds a lookup table for the closing prices of a partition
+        of a ticker's intraday bars.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            partition: A partition name, see get_intraday_partitions
+            date_range: (optional) A tuple of (first, last) dates, either
+                of which may be None, to which to limit the bars
+
+        Returns:
+            A dictionary with timestamps as keys and prices as values,
+            empty if there is no such partition
+        """
+        (first, last) = self._date_range_strs(date_range)
+        filename = self._intraday_filename_for(ticker, partition)
+        price_lookup = {}
+        if not self._has_file(filename):
             return price_lookup
-        if len(file_content) == 1:
-            line_data = file_content[i].split(',')
-            return {line_data[0]: float(line_data[4])}
-        # handle multi-line files & fill in holes with previous data
-        for i in range(0, len(file_content) - 1):
-            curr_line_data = file_content[i].split(',')
-            next_line_data = file_content[i + 1].split(',')
-            curr_date = datetime.datetime.strptime(
-                curr_line_data[0], DataManager.DATE_FORMAT)
-            next_date = datetime.datetime.strptime(
-                next_line_data[0], DataManager.DATE_FORMAT)
-            while curr_date < next_date:
-                price_lookup[curr_date.strftime(DataManager.DATE_FORMAT)] \
-                    = float(curr_line_data[4])
-                if fill:
-                    curr_date = curr_date + datetime.timedelta(1)
-                else:
-                    curr_date = next_date
-        # handle last line in file separately
-        price_lookup[next_date.strftime(
-            DataManager.DATE_FORMAT)] = float(next_line_data[4])
+        with self._open_file(filename, 'r') as file:
+            for line in file:
+                row = line.split(',')
+                if first <= row[0][:10] <= last:
+                    price_lookup[row[0]] = float(row[4])
         return price_lookup
 
+    def read_indicator_cache(self, ticker, indicator_code, price_hash):
+        """Reads an indicator from the indicator cache. The file is
+        memory-mapped and its dates and values copied into a new LUT.
+        An entry written before the ticker's data last changed is
+        removed.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            indicator_code: A string coding the indicator and period
+            price_hash: A 16 byte hash of the prices the indicator was
+                computed from
+
+        Returns:
+            A dictionary with date ordinals as keys and indicator
+            values as values, or None if there is no valid entry
+        """
+        filename = self._indicator_filename_for(ticker, indicator_code,
+                                                price_hash)
+        try:
+            with open(filename, 'rb') as file:
+                content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        with content:
+            header = DataManager.INDICATOR_HEADER
+            if len(content) < header.size:
+                return None
+            (magic, byteorder, entry_hash, checksum,
+             rows) = header.unpack_from(content)
+            if (magic != DataManager.INDICATOR_MAGIC
+                    or byteorder != sys.byteorder[0].encode()
+                    or entry_hash != price_hash
+                    or len(content) != header.size + rows * 16):
+                return None
+            current_checksum = self._data_checksum_for(ticker)
+            if checksum != current_checksum:
+                content.close()
+                self._remove_stale_indicators_for(ticker, current_checksum)
+                return None
+            with memoryview(content)[header.size:] as view:
+                with view[:rows * 8].cast('q') as dates, \
+                        view[rows * 8:].cast('d') as values:
+                    indicator_lut = dict(zip(dates, values))
+        return indicator_lut
+
+    def write_indicator_cache(self, ticker, indicator_code, price_hash,
+                              indicator_lut):
+        """Writes an indicator to the indicator cache, after removing
+        the ticker's entries from before its data last changed (if not
+        done yet by this process).
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            indicator_code: A string coding the indicator and period
+            price_hash: A 16 byte hash of the prices the indicator was
+                computed from
+            indicator_lut: A dictionary with date ordinals as keys and
+                indicator values as values
+        """
+        checksum = self._data_checksum_for(ticker)
+        self._remove_stale_indicators_for(ticker, checksum)
+        filename = self._indicator_filename_for(ticker, indicator_code,
+                                                price_hash)
+        dates = array('q', sorted(indicator_lut.keys()))
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(self._temp_filename_for(filename), 'wb') as file:
+                file.write(DataManager.INDICATOR_HEADER.pack(
+                    DataManager.INDICATOR_MAGIC, sys.byteorder[0].encode(),
+                    price_hash, checksum, len(dates)))
+                dates.tofile(file)
+                array('d', [indicator_lut[date] for date in dates]).tofile(
+                    file)
+            os.replace(file.name, filename)
+        except OSError:
+            pass
+
+    def _indicator_dir_for(self, ticker):
+        """Returns the directory of a ticker's cached indicators.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A string representing the directory, ending with a '/'
+        """
+        return '{}{}/{}/'.format(self.cache_location,
+                                 DataManager.INDICATOR_DIRNAME,
+                                 ticker.upper())
+
+    def _indicator_filename_for(self, ticker, indicator_code, price_hash):
+        """Returns the indicator cache file name for an indicator of a
+        ticker's prices, including the path to said file.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            indicator_code: A string coding the indicator and period
+            price_hash: A 16 byte hash of the prices
+
+        Returns:
+            A string representing the filename, including path
+        """
+        return '{}{}-{}.bin'.format(self._indicator_dir_for(ticker),
+                                    indicator_code.upper(), price_hash.hex())
+
+    def _data_checksum_for(self, ticker):
+        """Returns the manifest checksum of a ticker's data, which
+        changes whenever the data does. The checksum is memoized until
+        the modification time or size of the data changes, so the
+        manifest isn't consulted on every indicator cache access.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A CRC-32 value, 0 if there is no data for the ticker
+        """
+        ticker = ticker.upper()
+        try:
+            version = self._price_cache_key_for(ticker, None)
+        except OSError:
+            return 0
+        if ticker not in self._checksums or (
+                self._checksums[ticker][0] != version):
+            entry = self.read_manifest(ticker)
+            self._checksums[ticker] = (version,
+                                       entry['checksum'] if entry else 0)
+        return self._checksums[ticker][1]
+
+    def _remove_stale_indicators_for(self, ticker, checksum):
+        """Removes a ticker's cached indicators written before its data
+        last changed, unless this process already did so for the same
+        data (see swept_indicators).
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            checksum: The ticker's current data checksum
+        """
+        directory = self._indicator_dir_for(ticker)
+        swept = (os.path.abspath(directory), checksum)
+        if swept in DataManager.swept_indicators:
+            return
+        DataManager.swept_indicators.add(swept)
+        header = DataManager.INDICATOR_HEADER
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.bin'):
+                continue
+            try:
+                with open(directory + name, 'rb') as file:
+                    content = file.read(header.size)
+                if (len(content) < header.size
+                        or header.unpack(content)[3] != checksum):
+                    os.remove(directory + name)
+            except OSError:
+                pass
+
+    def _intraday_dir_for(self, ticker):
+        """Returns the directory of a ticker's intraday bars.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A string representing the directory, ending with a '/'
+        """
+        return '{}{}/{}/'.format(self.data_location,
+                                 DataManager.INTRADAY_DIRNAME,
+                                 ticker.upper())
+
+    def _intraday_filename_for(self, ticker, partition):
+        """Returns the file name for a partition of a ticker's
+        intraday bars, like _filename_for does for daily data.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            partition: A partition name, see get_intraday_partitions
+
+        Returns:
+            A string representing the filename, including path
+        """
+        base = self._intraday_dir_for(ticker) + partition
+        for extension in DataManager.EXTENSIONS.values():
+            if os.path.isfile(base + extension):
+                return base + extension
+        return base + DataManager.EXTENSIONS[self.compression]
+
     def build_strategy(self, strategy_name, strategy_dir='./'):
         """Given a strategy name (the name of the file within which
         the strategy is coded) and builds the data structure for Brain
@@ -144,8 +758,8 @@ class DataManager(object):
 
         Returns:
             A tuple containing the strategy structure, a set of assets
-            to add to the Market, and a set of indicators to add to the
-            Market
+            to add to the Market, and a set of (ticker, indicator)
+            tuples for the indicators of each asset the signals use
         """
         lines = self._readlines(strategy_dir + strategy_name)
         stocks_needed = set({})
@@ -159,9 +773,9 @@ class DataManager(object):
             strategy['assets'].add(ticker.upper())
             stocks_needed.add(ticker.upper())
             for signal in [buy_signal, sell_signal]:
-                (tickers, indicators) = self._parse_signal(signal)
+                (tickers, pairs) = self._parse_signal(signal)
                 stocks_needed |= tickers
-                indicators_needed |= indicators
+                indicators_needed |= pairs
             strategy['positions'].append({
                 'is_holding': False,
                 'ratio': float(ratio),
@@ -179,19 +793,80 @@ class DataManager(object):
             signal_code: A code for a buy or sell signal
 
         Returns:
-            A tuple containing a set of tickers and a set of indicators
+            A tuple containing a set of tickers and a set of (ticker,
+            indicator) tuples
         """
         if signal_code in ['ALWAYS', 'NEVER']:
             return (set({}), set({}))
         tickers = set({})
-        indicators = set({})
+        pairs = set({})
         (val_a_code, _, val_b_code) = signal_code.split(' ')
         for code in [val_a_code, val_b_code]:
             (ticker, indicator) = code.split('~')
             tickers.add(ticker.upper())
             if indicator not in ['PRICE']:
-                indicators.add(indicator.upper())
-        return (tickers, indicators)
+                pairs.add((ticker.upper(), indicator.upper()))
+        return (tickers, pairs)
+
+    def _index_after(self, data, date):
+        """Binary searches chronological data for the first row after
+        a given date.
+
+        Args:
+            data: An array in [[date,open,high,low,close,volume],...]
+                format, in chronological order
+            date: A date string
+
+        Returns:
+            The index of the first row with a later date, or the length
+            of the data if there is none
+        """
+        (low, high) = (0, len(data))
+        while low < high:
+            middle = (low + high) // 2
+            if data[middle][0] <= date:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _read_last_row_for(self, ticker):
+        """Reads the last row of the CSV file for a given ticker by
+        seeking backwards from the end of the file, so the rest of the
+        file is never read.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            An array containing the data for the last row in the file,
+            or None if there is no file or it is empty
+        """
+        if self.backend == 'sqlite':
+            rows = self._read_sqlite_rows_for(ticker, last_only=True)
+            return rows[0] if rows else None
+        if not self._has_file_for(ticker):
+            return None
+        if not self._filename_for(ticker).endswith('.csv'):
+            # compressed files can't be read backwards, so stream them
+            last_line = None
+            for line in self._iterlines_for(ticker):
+                last_line = line or last_line
+            if not last_line:
+                return None
+            return [value.strip() for value in last_line.split(',')]
+        tail = b''
+        with open(self._filename_for(ticker), 'rb') as file:
+            position = file.seek(0, os.SEEK_END)
+            while position > 0 and b'\n' not in tail.rstrip():
+                step = min(4096, position)
+                position -= step
+                file.seek(position)
+                tail = file.read(step) + tail
+        last_line = tail.rstrip().rsplit(b'\n', 1)[-1].decode().strip()
+        if not last_line:
+            return None
+        return [value.strip() for value in last_line.split(',')]
 
     def _write_data_to_csv_file(self, filename, data, mode):
         """Writes an array of data to disk in CSV format.
@@ -201,9 +876,38 @@ class DataManager(object):
             data: An array in [[date,open,high,low,close,volume],...]
                 format
         """
-        with open(filename, mode) as file:
-            for line in data:
-                file.write(','.join(line) + '\n')
+        with self._open_file(filename, mode) as file:
+            file.write(self._csv_text_for(data))
+
+    def _csv_text_for(self, data):
+        """Returns an array of data in CSV format.
+
+        Args:
+            data: An array in [[date,open,high,low,close,volume],...]
+                format
+
+        Returns:
+            A string with a line for each row
+        """
+        return ''.join([','.join(line) + '\n' for line in data])
+
+    def _open_file(self, filename, mode):
+        """Opens a CSV file, decompressing/compressing it according to
+        its extension.
+
+        Args:
+            filename: A string representing the name of a file
+            mode: A string representing the mode to open the file in
+
+        Returns:
+            A file object, in text mode unless 'b' is in the mode
+        """
+        for (extension, opener) in DataManager.OPENERS.items():
+            if filename.endswith(extension) and extension != '.csv':
+                if 'b' not in mode:
+                    mode += 't'
+                return opener(filename, mode)
+        return open(filename, mode)
 
     def _filename_for(self, ticker):
         """Returns the file name for a ticker, including the path to
@@ -214,9 +918,185 @@ class DataManager(object):
 
         Returns:
             A String representing the filename, inluding path, for the
-            given ticker
+            given ticker. This is the existing file with any of the
+            EXTENSIONS if there is one, otherwise a new file with the
+            extension for this DataManager's compression
+        """
+        base = self.data_location + ticker.upper()
+        for extension in DataManager.EXTENSIONS.values():
+            if os.path.isfile(base + extension):
+                return base + extension
+        return base + DataManager.EXTENSIONS[self.compression]
+
+    def _price_cache_key_for(self, ticker, fill, date_range=None):
+        """Returns the part of a price_cache key identifying the
+        current version of a ticker's data.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            fill: Whether or not holidays/weekends are filled
+            date_range: (optional) A tuple of (start, end) dates
+
+        Returns:
+            A tuple of the file path, ticker, fill flag, date range,
+            mtime and size
+        """
+        if self.backend == 'sqlite':
+            filename = self.data_location + DataManager.SQLITE_FILENAME
+        else:
+            filename = self._filename_for(ticker)
+        stat = os.stat(filename)
+        return (os.path.abspath(filename), ticker.upper(), fill,
+                date_range and tuple(date_range), stat.st_mtime_ns,
+                stat.st_size)
+
+    def _date_range_ordinals(self, date_range):
+        """Converts a date range to a range of date ordinals, with
+        missing ends replaced by the earliest/latest possible dates.
+
+        Args:
+            date_range: A tuple of (start, end) dates, or None
+
+        Returns:
+            A tuple of (start, end) date ordinals
+        """
+        (start, end) = date_range or (None, None)
+        return (date_ordinal(start) if start else 1,
+                date_ordinal(end) if end
+                else datetime.date.max.toordinal())
+
+    def _date_range_strs(self, date_range):
+        """Converts a date range to a range of date strings, with
+        missing ends replaced by the earliest/latest possible dates.
+
+        Args:
+            date_range: A tuple of (start, end) dates, or None
+
+        Returns:
+            A tuple of (start, end) date strings
+        """
+        (start, end) = date_range or (None, None)
+        return (date_str(start) if start else '',
+                date_str(end) if end else date_str(datetime.date.max))
+
+    def _manifest_entry_after_write(self, entry, data):
+        """Returns a manifest entry updated for rows written after the
+        rows it describes.
+
+        Args:
+            entry: A manifest entry for the existing rows, or None if
+                there are none
+            data: An array of rows written, in chronological order
+
+        Returns:
+            A new manifest entry, without mtime and size
+        """
+        entry = dict(entry or {'rows': 0, 'first': None, 'last': None,
+                               'checksum': 0})
+        if len(data):
+            entry['rows'] += len(data)
+            entry['first'] = entry['first'] or data[0][0]
+            entry['last'] = data[-1][0]
+            entry['checksum'] = zlib.crc32(
+                self._csv_text_for(data).encode(), entry['checksum'])
+        entry['mtime'] = None
+        entry['size'] = None
+        return entry
+
+    def _manifest_filename_for(self, ticker):
+        """Returns the manifest entry file name for a given ticker,
+        including the path to said file.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A string representing the filename, including path
+        """
+        return '{}{}/{}.json'.format(self.data_location,
+                                     DataManager.MANIFEST_DIRNAME,
+                                     ticker.upper())
+
+    def _load_manifest_entry(self, ticker):
+        """Loads a ticker's manifest entry from disk.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A manifest entry, or None if there is no valid entry
+        """
+        try:
+            with open(self._manifest_filename_for(ticker), 'r') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) else None
+
+    def _save_manifest_entry(self, ticker, entry):
+        """Saves a manifest entry to disk, replacing the ticker's entry
+        file atomically.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            entry: A manifest entry
+        """
+        filename = self._manifest_filename_for(ticker)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(self._temp_filename_for(filename), 'w') as file:
+                json.dump(entry, file, indent=1, sort_keys=True)
+            os.replace(file.name, filename)
+        except OSError:
+            pass
+
+    def _data_to_append_for(self, ticker, data):
+        """Returns the part of some data which comes after the last
+        row stored for a given ticker.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            data: An array in [[date,open,high,low,close,volume],...]
+                format, in chronological order
+
+        Returns:
+            An array of rows to append, which is empty unless the data
+            overlaps the stored data and extends past it
+        """
+        last_row = self._read_last_row_for(ticker)
+        if last_row is None:
+            return data
+        if (len(data) and last_row[0] < data[-1][0]
+                and last_row[0] >= data[0][0]):
+            return data[self._index_after(data, last_row[0]):]
+        return []
+
+    def _temp_filename_for(self, filename):
+        """Returns a temporary file name to write a file to before
+        moving it in place, unique to this process and thread so that
+        concurrent writers don't clash.
+
+        Args:
+            filename: A string representing the name of a file
+
+        Returns:
+            A string representing the temporary file name
         """
-        return self.data_location + ticker.upper() + ".csv"
+        return '{}.{}-{}.tmp'.format(filename, os.getpid(),
+                                     threading.get_ident())
+
+    def _cache_filename_for(self, ticker):
+        """Returns the binary cache file name for a ticker, including
+        the path to said file.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A String representing the cache filename, including path,
+            for the given ticker
+        """
+        return self.cache_location + ticker.upper() + ".bin"
 
     def _readlines(self, filename):
         """Returns the lines of the file for a given ticker.
@@ -243,11 +1123,24 @@ class DataManager(object):
             An array with each element containing a line of the file
             for the given ticker
         """
-        lines = []
-        if self._has_file_for(ticker):
-            with open(self._filename_for(ticker), 'r') as file:
-                lines = [line.strip() for line in file]
-        return lines
+        return list(self._iterlines_for(ticker))
+
+    def _iterlines_for(self, ticker):
+        """Streams the lines of the file for a given ticker, without
+        reading the whole file into memory.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A generator of the stripped lines of the file for the given
+            ticker
+        """
+        if not self._has_file_for(ticker):
+            return
+        with self._open_file(self._filename_for(ticker), 'r') as file:
+            for line in file:
+                yield line.strip()
 
     def _has_file(self, filename):
         """Returns whether a file exists.
@@ -260,6 +1153,22 @@ class DataManager(object):
         """
         return os.path.isfile(filename)
 
+    def _has_data_for(self, ticker):
+        """Returns whether there is stored data for a given ticker.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A boolean value representing whether or not there is data
+            for the given ticker
+        """
+        if self.backend == 'sqlite':
+            return self._sqlite().execute(
+                'SELECT 1 FROM prices WHERE ticker = ? LIMIT 1',
+                (ticker.upper(),)).fetchone() is not None
+        return self._has_file_for(ticker)
+
     def _has_file_for(self, ticker):
         """Returns whether a file for a given ticker exists.
 
@@ -273,12 +1182,13 @@ class DataManager(object):
         return os.path.isfile(self._filename_for(ticker))
 
     def _remove_file_for(self, ticker):
-        """Removes the file for the given ticker.
+        """Removes the file for the given ticker, with any extension.
 
         Args:
             ticker: A string representing the ticker of a stock
         """
-        os.remove(self._filename_for(ticker))
+        while self._has_file_for(ticker):
+            os.remove(self._filename_for(ticker))
 
     def _read_csv_file_rows_for(self, ticker):
         """Reads and returns the data in a CSV file for a given ticker
@@ -292,8 +1202,7 @@ class DataManager(object):
             for a row in a CSV file
         """
         data = []
-        file_content = self._readlines_for(ticker)
-        for line in file_content:
+        for line in self._iterlines_for(ticker):
             data.append([value.strip() for value in line.split(',')])
         return data
 
@@ -309,13 +1218,311 @@ class DataManager(object):
             for a column in a CSV file
         """
         data = []
-        file_content = self._readlines_for(ticker)
         # create arrays for each column
         for i in range(0, 6):
             data.append([])
         # iterate through file
-        for line in file_content:
+        for line in self._iterlines_for(ticker):
             values = line.split(',')
             for i in range(0, 6):
                 data[i].append(values[i].strip())
         return data
+
+    def _read_table_for(self, ticker, date_range=None):
+        """Reads and returns the rows of the file for a given ticker
+        as they are on disk, in columnar format, using the binary cache
+        when it is up to date and rebuilding it from the CSV file
+        otherwise.
+
+        When limited to a date range, the last row on or before the
+        start and the first row after the end are included as well,
+        since filling the range depends on them.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            date_range: (optional) A tuple of (start, end) dates
+
+        Returns:
+            A PriceTable with a row for every line in the file (or
+            range)
+        """
+        if self.backend == 'sqlite':
+            return self._read_sqlite_table_for(ticker, date_range)
+        if not self._has_file_for(ticker):
+            return PriceTable()
+        stat = os.stat(self._filename_for(ticker))
+        table = self._read_table_cache_for(ticker, stat, date_range)
+        if table is not None:
+            return table
+        table = self._parse_table_for(ticker)
+        self._write_table_cache_for(ticker, stat, table)
+        if date_range:
+            (first, last) = self._date_range_ordinals(date_range)
+            table = table.slice(
+                max(0, bisect_right(table.dates, first) - 1),
+                bisect_right(table.dates, last) + 1)
+        return table
+
+    def _parse_table_for(self, ticker):
+        """Parses the CSV file for a given ticker into columns. Values
+        which aren't numbers (e.g. '-' in generated data) become NaN.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A PriceTable with a row for every line in the file
+        """
+        table = PriceTable()
+        numeric = [table.column(name) for name in DataManager.COLUMNS]
+        for line in self._iterlines_for(ticker):
+            if not line:
+                continue
+            values = line.split(',')
+            table.dates.append(date_ordinal(values[0].strip()))
+            for i, column in enumerate(numeric):
+                try:
+                    column.append(float(values[i + 1]))
+                except (ValueError, IndexError):
+                    column.append(float('nan'))
+        return table
+
+    def _read_table_cache_for(self, ticker, stat, date_range=None):
+        """Reads the binary cache for a given ticker. The file is
+        memory-mapped, so that when limited to a date range only the
+        rows in the range (plus the rows around it, as in
+        _read_table_for) are read from disk.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            stat: The os.stat result of the ticker's CSV file, used to
+                check whether the cache is stale
+            date_range: (optional) A tuple of (start, end) dates
+
+        Returns:
+            A PriceTable, or None if there is no valid cache for the
+            current CSV file
+        """
+        try:
+            with open(self._cache_filename_for(ticker), 'rb') as file:
+                content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        with content:
+            header = DataManager.CACHE_HEADER
+            if len(content) < header.size:
+                return None
+            (magic, byteorder, mtime, size,
+             rows) = header.unpack_from(content)
+            if (magic != DataManager.CACHE_MAGIC
+                    or byteorder != sys.byteorder[0].encode()
+                    or mtime != stat.st_mtime_ns
+                    or size != stat.st_size
+                    or len(content) != header.size
+                    + rows * 8 * (len(DataManager.COLUMNS) + 1)):
+                return None
+            table = PriceTable()
+            with memoryview(content) as view:
+                (start, stop) = (0, rows)
+                if date_range:
+                    (first, last) = self._date_range_ordinals(date_range)
+                    with view[header.size:header.size
+                              + rows * 8].cast('q') as dates:
+                        start = max(0, bisect_right(dates, first) - 1)
+                        stop = min(rows, bisect_right(dates, last) + 1)
+                offset = header.size
+                for column in [table.dates] + [
+                        table.column(name) for name in DataManager.COLUMNS]:
+                    column.frombytes(
+                        view[offset + start * 8:offset + stop * 8])
+                    offset += rows * 8
+        return table
+
+    def _write_table_cache_for(self, ticker, stat, table):
+        """Writes the binary cache for a given ticker.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            stat: The os.stat result of the ticker's CSV file
+            table: A PriceTable to write
+        """
+        filename = self._cache_filename_for(ticker)
+        try:
+            os.makedirs(self.cache_location, exist_ok=True)
+            with open(self._temp_filename_for(filename), 'wb') as file:
+                file.write(DataManager.CACHE_HEADER.pack(
+                    DataManager.CACHE_MAGIC, sys.byteorder[0].encode(),
+                    stat.st_mtime_ns, stat.st_size, len(table)))
+                table.dates.tofile(file)
+                for name in DataManager.COLUMNS:
+                    table.column(name).tofile(file)
+            os.replace(file.name, filename)
+        except OSError:
+            pass
+
+    def _sqlite(self):
+        """Returns this thread's connection to the SQLite database in
+        the data location, opening it and creating the tables if
+        needed. SQLite connections can't be shared between threads.
+
+        Returns:
+            An sqlite3 Connection
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect_sqlite()
+            self._local.connection = connection
+        return connection
+
+    def _connect_sqlite(self):
+        """Opens the SQLite database in the data location, creating the
+        tables if needed.
+
+        Returns:
+            An sqlite3 Connection
+        """
+        connection = sqlite3.connect(
+            self.data_location + DataManager.SQLITE_FILENAME)
+        # values are kept as text, exactly as downloaded, so rows read
+        # back the same as CSV rows (including placeholders like '-')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS prices ('
+            'ticker TEXT NOT NULL, date INTEGER NOT NULL, '
+            'open TEXT, high TEXT, low TEXT, close TEXT, volume TEXT, '
+            'PRIMARY KEY (ticker, date)) WITHOUT ROWID')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS manifest ('
+            'ticker TEXT PRIMARY KEY, rows INTEGER, first TEXT, '
+            'last TEXT, checksum INTEGER)')
+        return connection
+
+    def _write_data_to_sqlite(self, ticker, data, append):
+        """Writes an array of data to the SQLite database in a single
+        transaction.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            data: An array in [[date,open,high,low,close,volume],...]
+                format
+            append: A boolean representing whether or not to append to
+                existing data, same as in write_stock_data
+        """
+        ticker = ticker.upper()
+        manifest_entry = None
+        with self._sqlite():
+            if append:
+                manifest_entry = self.read_manifest(ticker)
+                data = self._data_to_append_for(ticker, data)
+            else:
+                self._sqlite().execute(
+                    'DELETE FROM prices WHERE ticker = ?', (ticker,))
+            data = [row[:6] for row in data]
+            self._sqlite().executemany(
+                'INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ([ticker, date_ordinal(row[0])] + list(row[1:])
+                 for row in data))
+            self._write_sqlite_manifest_entry(
+                ticker, self._manifest_entry_after_write(manifest_entry, data))
+
+    def _read_sqlite_manifest_for(self, ticker):
+        """Reads the manifest entry for a given ticker from the SQLite
+        database, building it if it's missing.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+
+        Returns:
+            A manifest entry, or None if there is no data for the ticker
+        """
+        row = self._sqlite().execute(
+            'SELECT rows, first, last, checksum FROM manifest '
+            'WHERE ticker = ?', (ticker,)).fetchone()
+        if row is not None:
+            return {'rows': row[0], 'first': row[1], 'last': row[2],
+                    'checksum': row[3], 'mtime': None, 'size': None}
+        if not self._has_data_for(ticker):
+            return None
+        entry = self._manifest_entry_after_write(
+            None, self._read_sqlite_rows_for(ticker))
+        with self._sqlite():
+            self._write_sqlite_manifest_entry(ticker, entry)
+        return entry
+
+    def _write_sqlite_manifest_entry(self, ticker, entry):
+        """Writes a manifest entry to the SQLite database, as part of
+        the current transaction.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            entry: A manifest entry
+        """
+        self._sqlite().execute(
+            'INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?)',
+            (ticker, entry['rows'], entry['first'], entry['last'],
+             entry['checksum']))
+
+    def _read_sqlite_rows_for(self, ticker, last_only=False):
+        """Reads the rows for a given ticker from the SQLite database,
+        as strings in the same format as CSV rows.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            last_only: (optional) Whether or not to only read the last
+                row
+
+        Returns:
+            An array, where each element is an array containing data
+            for a row
+        """
+        query = ('SELECT date, open, high, low, close, volume FROM prices '
+                 'WHERE ticker = ? ORDER BY date')
+        if last_only:
+            query += ' DESC LIMIT 1'
+        rows = self._sqlite().execute(query, (ticker.upper(),)).fetchall()
+        date_strs = date_strs_for([row[0] for row in rows])
+        return [[date_strs[i]] + list(row[1:])
+                for (i, row) in enumerate(rows)]
+
+    def _read_sqlite_table_for(self, ticker, date_range=None):
+        """Reads the rows for a given ticker from the SQLite database
+        in columnar format, using the primary key index to only read
+        the rows needed for a date range.
+
+        Args:
+            ticker: A string representing the ticker of a stock
+            date_range: (optional) A tuple of (start, end) dates, see
+                _read_table_for
+
+        Returns:
+            A PriceTable with a row for every row in the range
+        """
+        ticker = ticker.upper()
+        (first, last) = self._date_range_ordinals(date_range)
+        rows = self._sqlite().execute(
+            'SELECT date, open, high, low, close, volume FROM prices '
+            'WHERE ticker = ?1 '
+            'AND date >= coalesce((SELECT max(date) FROM prices '
+            '                      WHERE ticker = ?1 AND date <= ?2), ?2) '
+            'AND date <= coalesce((SELECT min(date) FROM prices '
+            '                      WHERE ticker = ?1 AND date > ?3), ?3) '
+            'ORDER BY date', (ticker, first, last)).fetchall()
+        table = PriceTable(array('q', [row[0] for row in rows]))
+        for (i, name) in enumerate(DataManager.COLUMNS):
+            table.column(name).extend(
+                [self._to_float(row[i + 1]) for row in rows])
+        return table
+
+    def _to_float(self, value):
+        """Converts a stored value to a float, with values which aren't
+        numbers (e.g. '-' in generated data) becoming NaN.
+
+        Args:
+            value: A value to convert
+
+        Returns:
+            A float
+        """
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float('nan')
@@ -200,6 +200,12 @@ if __name__ == "__main__":
     parser.add_argument('--using', default='google', nargs=1,
                         help=('a source/API from which to get the data, '
                               'default: google'))
+    parser.add_argument('--backend', default='csv',
+                        choices=DataManager.BACKENDS,
+                        help='how to store the data, default: csv')
+    parser.add_argument('--compression', default=None,
+                        choices=['gzip', 'lzma'],
+                        help='how to compress new CSV files, default: none')
     download_group = parser.add_mutually_exclusive_group(required=True)
     download_group.add_argument('--download', nargs='+',
                                 help='the stock ticker(s) to download')
@@ -208,7 +214,8 @@ if __name__ == "__main__":
                                       'download'))
 
     downloader = Downloader()
-    db = DataManager()
+    db = DataManager(backend=parser.parse_args().backend,
+                     compression=parser.parse_args().compression)
 
     main()
     print("Did nothing.")
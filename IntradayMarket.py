@@ -0,0 +1,223 @@
+from bisect import bisect_right
+
+from utils import date_str
+
+from Alignment import Alignment
+from Market import Market
+
+
+class IntradayMarket(Market):
+
+    """A Market of intraday bars (e.g. minute bars), streamed from disk
+    one partition at a time.
+
+    The bars are stored by DataManager.write_intraday_data, in one file
+    per ticker per day or month, which must be the same for all stocks
+    of an IntradayMarket. Only the bars of the current partition
+    are held in memory, and the next partition is loaded when the
+    current one runs out, so years of bars for many stocks can be
+    played back with memory bounded by the size of a partition.
+
+    Dates are 'YYYY-MM-DD HH:MM[:SS]' timestamps, and the stocks of
+    each partition are aligned with this Market's alignment policy
+    (see Market.use_alignment), with 'ffill' carrying prices over from
+    the previous partition. Indicators are not supported, as they are
+    computed from a stock's full price history.
+
+    Attributes:
+        partitions: A sorted array of the partitions with bars for any
+            of this Market's stocks
+        partition: The index of the current partition in partitions
+    """
+
+    SUPPORTS_INDICATORS = False
+
+    def __init__(self, tickers=None):
+        """Initializes an IntradayMarket.
+
+        Args:
+            tickers: (optional) An array of tickers of stocks with
+                intraday bars
+        """
+        self.partitions = []
+        self.partition = -1
+        self._tickers = []
+        self._date_range = None
+        self._date_range_bars = None
+        self._last_prices = {}
+        super(IntradayMarket, self).__init__(tickers)
+
+    def add_stocks(self, tickers, date_range=None):
+        """Adds stocks to this IntradayMarket. Their bars are only read
+        once the dates are set, see set_default_dates.
+
+        Args:
+            tickers: An array of tickers of stocks with intraday bars
+            date_range: (optional) A tuple of (start, end) dates to
+                which to limit the bars, either of which may be None
+        """
+        for ticker in tickers:
+            if ticker.upper() not in self._tickers:
+                self._tickers.append(ticker.upper())
+                self.stocks[ticker.upper()] = {}
+                self.stocks_indicators[ticker.upper()] = {}
+        self._date_range = date_range
+
+    def add_indicator(self, ticker, indicator, indicator_lut):
+        """Indicators are not supported by an IntradayMarket."""
+        raise ValueError('indicators are not supported by an '
+                         'IntradayMarket')
+
+    def set_default_dates(self):
+        """Finds the partitions with bars for this IntradayMarket's
+        stocks and moves it to the first bar at which every stock has
+        a price (within the first partition)."""
+        partitions = set({})
+        for ticker in self._tickers:
+            partitions.update(self._db.get_intraday_partitions(
+                ticker, self._date_range))
+        if len(set(len(partition) for partition in partitions)) > 1:
+            raise ValueError('intraday data of all stocks must be '
+                             'partitioned the same way')
+        self.partitions = sorted(partitions)
+        self.partition = -1
+        self.dates = []
+        self._last_prices = {}
+        # find the last bar first, which also finds whether there are
+        # any bars at all
+        last = None
+        i = len(self.partitions) - 1
+        while last is None and i >= 0:
+            lasts = [max(lut.keys())
+                     for lut in self._read_partition(i).values() if lut]
+            last = max(lasts) if lasts else None
+            i -= 1
+        if last is None:
+            raise ValueError('no intraday bars for {}'.format(
+                ', '.join(self._tickers)))
+        self._load_partition(0)
+        first = 0
+        while (first + 1 < len(self.dates)
+               and any(prices[first] != prices[first]
+                       for prices in self._price_arrays.values())):
+            first += 1
+        super(IntradayMarket, self).set_date(self.dates[first])
+        self._date_range_bars = (self.dates[first], last)
+
+    def get_date_range(self):
+        """Returns the timestamps of the first and last bar of this
+        IntradayMarket.
+
+        Returns:
+            A tuple of (first, last) timestamps
+        """
+        return self._date_range_bars
+
+    def set_date(self, date):
+        """Sets this IntradayMarket to a given date or timestamp,
+        loading the partition it falls in. A date without a bar snaps
+        to the next bar, or to the first or last bar if out of range.
+
+        Args:
+            date: A date or timestamp to which to set this Market
+        """
+        date = self._date_key(date)
+        length = len(self.partitions[0])
+        i = max(0, bisect_right(self.partitions, date[:length]) - 1)
+        if i != self.partition:
+            self._load_partition(i)
+        while (date > self.dates[-1]
+               and self.partition + 1 < len(self.partitions)):
+            self._load_partition(self.partition + 1)
+        return super(IntradayMarket, self).set_date(date)
+
+    def advance_day(self):
+        """Advances this IntradayMarket by one bar, loading the next
+        partition at the end of the current one."""
+        if self.date[0] + 1 < len(self.dates):
+            super(IntradayMarket, self).advance_day()
+            return
+        self._load_partition(self.partition + 1)
+        self.new_period.index = 0
+
+    def _date_key(self, date):
+        """Internal function to convert a date to a timestamp, as
+        bars are dated by timestamp strings rather than date ordinals.
+
+        Args:
+            date: A date string, timestamp, ordinal or object
+
+        Returns:
+            A date string or timestamp
+        """
+        return date_str(date)
+
+    def _date_strs_for(self, dates):
+        """Internal function to get the strings for a set of bars,
+        which are their timestamps.
+
+        Args:
+            dates: An array of timestamps
+
+        Returns:
+            An array of timestamps
+        """
+        return list(dates)
+
+    def _load_partition(self, i):
+        """Internal function to replace the bars in memory with those
+        of a partition, skipping partitions without bars in range.
+
+        Args:
+            i: An index in partitions
+        """
+        previous = self.dates[-1] if self.dates else None
+        if i != self.partition + 1:
+            previous = None
+            self._last_prices = {}
+            if i > 0:
+                self._remember_last_prices(self._read_partition(i - 1))
+        luts = self._read_partition(i)
+        while not any(luts.values()):
+            i += 1
+            luts = self._read_partition(i)
+        self.partition = i
+        alignment = Alignment(luts, self._alignment)
+        if self._alignment == 'ffill':
+            for (ticker, prices) in alignment.arrays.items():
+                j = 0
+                while j < len(prices) and prices[j] != prices[j]:
+                    prices[j] = self._last_prices.get(ticker, prices[j])
+                    j += 1
+        self.stocks = luts
+        self._set_dates(alignment.dates, previous)
+        self.alignment = alignment
+        for (ticker, prices) in alignment.arrays.items():
+            self._price_arrays[ticker] = memoryview(prices).toreadonly()
+        self._remember_last_prices(luts)
+
+    def _read_partition(self, i):
+        """Internal function to read a partition of bars for each of
+        this IntradayMarket's stocks.
+
+        Args:
+            i: An index in partitions
+
+        Returns:
+            A map of tickers to price LUTs, empty for stocks without
+            bars in the partition
+        """
+        return {ticker: self._db.build_intraday_lut(
+                    ticker, self.partitions[i], self._date_range)
+                for ticker in self._tickers}
+
+    def _remember_last_prices(self, luts):
+        """Internal function to keep each stock's last price in a
+        partition, to carry over to the next one.
+
+        Args:
+            luts: A map of tickers to price LUTs
+        """
+        for (ticker, lut) in luts.items():
+            if lut:
+                self._last_prices[ticker] = lut[max(lut.keys())]
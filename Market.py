@@ -1,9 +1,16 @@
-from datetime import datetime as dt
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+import datetime
 
+from utils import date_ordinal
 from utils import date_str
-from utils import date_obj
+from utils import date_strs_for
 
+from Alignment import Alignment
 from DataManager import DataManager
+from PeriodFlags import PeriodFlags
 
 
 class Market(object):
@@ -12,15 +19,51 @@ class Market(object):
 
     Can be queried for stock prices at the current date of this Market
 
+    Once this Market has dates, each stock's prices and indicators are
+    also stored as arrays aligned with the dates (prices when the dates
+    are set, indicators the first time they're queried), so queries at
+    the current date are plain array reads at the current date index
+    instead of lookups by date string.
+    Days without data are stored as NaN.
+
+    Internally, dates are date ordinals (see utils.date_ordinal), as
+    are the keys of the price and indicator LUTs. Date strings are only
+    made once per date, for current_date, and dates given to a Market
+    may be strings, ordinals or date objects.
+
+    By default a Market steps over every calendar day, with prices
+    filled over weekends and holidays. With use_trading_calendar, it
+    steps only over days on which stocks loaded from disk traded.
+    Either way, when its dates are set all stocks are aligned once on
+    a common date axis with an Alignment, whose policy decides what a
+    stock reads on days it has no price (see use_alignment), so gaps
+    are handled at load time rather than when querying.
+
     Attributes:
-        stocks: A map of stock tickers to price LUTs
-        new_period: A map of flags for market periods
-        dates: An array of dates for the market
-        date: A tuple containing (curr date index in dates, curr date)
+        stocks: A map of stock tickers to price LUTs, keyed by date
+            ordinals
+        stock_tables: A map of stock tickers to OHLCV PriceTables for
+            the date range of their prices, loaded the first time a
+            ticker's table is queried
+        new_period: A map of flags for market periods ('w', 'm', 'q'
+            and 'y'), set on days that start a new period
+        trading_calendar: Whether this Market steps only over trading
+            days
+        frequency: The period of each of this Market's bars, i.e. 'd'
+            for daily, or 'w', 'm', 'q' for resampled bars dated at
+            the end of each week, month or quarter
+        alignment: The Alignment of the stocks on this Market's dates,
+            which reports their gaps, or None before dates are set
+        dates: An array of date ordinals for the market
+        date: A tuple containing (curr date index in dates, curr date
+            ordinal)
 
     Todo:
     """
 
+    # whether indicators can be added, see add_indicator
+    SUPPORTS_INDICATORS = True
+
     def __init__(self, tickers=None, dates=None):
         """Intialize a Market with a set of dates and stock tickers
         with corresponding price LUTs.
@@ -30,31 +73,177 @@ class Market(object):
             dates: An array of dates
         """
         self._db = DataManager()
-        self.new_period = {'m': False, 'q': False, 'y': False}
+        self.new_period = PeriodFlags()
         self.commissions = 10
         self.stocks = {}
+        self._daily_luts = {}
+        self.stock_tables = {}
+        self._injected = set({})
+        self._loaded_ranges = {}
+        self._loaders = (1, False)
         self.stocks_indicators = {}
+        self._use_arrays = True
+        self._price_arrays = {}
+        self._indicator_arrays = {}
+        self.trading_calendar = False
+        self.frequency = 'd'
+        self.alignment = None
+        self._alignment = 'ffill'
         if tickers != None:
             self.add_stocks(tickers)
         self.dates = []
         self.date = (-1, None)
+        self._date_indices = {}
+        self._date_strs = []
         if dates != None:
-            self.dates = dates
-            self.date = (0, self.dates[0])
+            self._set_dates([self._date_key(date) for date in dates])
+
+    def use_data_manager(self, db):
+        """Sets the DataManager this Market should load stock data
+        from, e.g. one using a different storage backend.
+
+        Args:
+            db: A DataManager instance to use
+        """
+        self._db = db
+
+    def use_arrays(self, enabled=True):
+        """Sets whether this Market answers queries from arrays aligned
+        with its dates (the default) or directly from the LUTs.
+
+        Args:
+            enabled: (optional) A boolean for whether to use arrays
+        """
+        self._use_arrays = enabled
+        self._price_arrays = {}
+        self._indicator_arrays = {}
+
+    def use_trading_calendar(self, enabled=True, alignment='ffill'):
+        """Sets whether this Market steps only over trading days, i.e.
+        days on which its stocks loaded from disk have prices. Should be
+        set before adding stocks, as it changes how their prices are
+        loaded.
+
+        Args:
+            enabled: (optional) A boolean for whether to use trading
+                days
+            alignment: (optional) An alignment policy for stocks
+                without a price on a day another stock traded (e.g. a
+                holiday on its exchange only), see use_alignment,
+                default: 'ffill'
+        """
+        self.trading_calendar = enabled
+        self.stock_tables = {}
+        self.use_alignment(alignment)
+
+    def use_alignment(self, policy):
+        """Sets how this Market aligns its stocks on its dates, which
+        takes effect when its dates are set.
 
-    def add_stocks(self, tickers):
+        Policies (see Alignment):
+            - 'intersection': only days on which every stock loaded
+                from disk has a price
+            - 'ffill': every day any stock loaded from disk has a
+                price, carrying a stock's last price and indicator
+                values forward on days it has none (the default)
+            - 'mask': as 'ffill', but a stock has no price on days it
+                has none, so queries print a message and return None,
+                and lookback windows contain NaN. Meant for analysis
+                of the aligned prices, as a Portfolio holding a stock
+                cannot be valued on a day it is masked
+
+        Args:
+            policy: An alignment policy, see Alignment.POLICIES
+        """
+        if policy not in Alignment.POLICIES:
+            raise ValueError('unknown alignment policy: {}'.format(policy))
+        self._alignment = policy
+        self._price_arrays = {}
+        self._indicator_arrays = {}
+
+    def use_frequency(self, frequency):
+        """Sets the period of this Market's bars. Daily prices are
+        resampled to one bar per period, so indicators computed from
+        this Market's price LUTs are computed on the resampled prices.
+        Stocks already added or injected are resampled from their daily
+        prices, and their indicators dropped.
+
+        Args:
+            frequency: A period, i.e. 'd' (daily, the default), 'w',
+                'm' or 'q'
+        """
+        if frequency not in ('d', 'w', 'm', 'q'):
+            raise ValueError('unknown frequency: {}'.format(frequency))
+        if frequency == self.frequency:
+            return
+        self.frequency = frequency
+        self.stock_tables = {}
+        for (ticker, price_lut) in self._daily_luts.items():
+            self._forget_arrays_for(ticker)
+            self.stocks[ticker] = self._resample_lut(price_lut)
+            self.stocks_indicators[ticker] = {}
+
+    def set_loaders(self, workers, processes=False):
+        """Sets how many stocks this Market loads at the same time
+        when adding several stocks at once.
+
+        Args:
+            workers: A number of stocks to load concurrently, 1 loads
+                them one after another
+            processes: (optional) Whether to load stocks in separate
+                processes rather than threads, which lets parsing use
+                multiple cores (default: False). Either way, stocks
+                already in the DataManager's price_cache aren't loaded
+                again, and loaded ones are added to it
+        """
+        self._loaders = (max(1, int(workers)), processes)
+
+    def add_stocks(self, tickers, date_range=None):
         """Creates price LUTs and adds them to the Market. Also sets up
         the data structures for indicators.
 
+        The LUTs are loaded concurrently if set up with set_loaders.
+
         Args:
             tickers: An array of tickers for which to create LUTs
+            date_range: (optional) A tuple of (start, end) dates to
+                which to limit the LUTs, either of which may be None,
+                so only the prices needed are loaded
         """
-        for ticker in tickers:
-            self.stocks[ticker.upper()] \
-                = self._db.build_price_lut(ticker.upper())
+        tickers = [ticker.upper() for ticker in tickers]
+        price_luts = self._load_price_luts(tickers, date_range)
+        for (ticker, price_lut) in zip(tickers, price_luts):
+            self._forget_arrays_for(ticker)
+            # rebuilt for the new date range when queried, so that with
+            # a Simulator's block_days only a block's table is kept
+            self.stock_tables.pop(ticker, None)
+            self._injected.discard(ticker)
+            self._loaded_ranges[ticker] = date_range
+            self._daily_luts[ticker] = price_lut
+            self.stocks[ticker] = self._resample_lut(price_lut)
             # create empty dict to be populated later by indicators
             self.stocks_indicators[ticker.upper()] = {}
 
+    def _load_price_luts(self, tickers, date_range):
+        """Internal function to load the price LUTs for a set of
+        tickers, concurrently if set up with set_loaders.
+
+        Args:
+            tickers: An array of tickers for which to load LUTs
+            date_range: A tuple of (start, end) dates, or None
+
+        Returns:
+            An array of price LUTs, in the same order as the tickers
+        """
+        (workers, processes) = self._loaders
+        fill = not self.trading_calendar
+        if workers == 1 or len(tickers) <= 1:
+            return self._db.build_price_luts(tickers, fill, date_range)
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(max_workers=min(workers, len(tickers))) as executor:
+            return self._db.build_price_luts(tickers, fill, date_range,
+                                             executor)
+
     def add_indicator(self, ticker, indicator, indicator_lut):
         """Adds the indicator data for a ticker to this Market.
 
@@ -65,6 +254,7 @@ class Market(object):
         """
         self.stocks_indicators[ticker.upper()][indicator.upper()] = \
             indicator_lut
+        self._indicator_arrays.pop((ticker.upper(), indicator.upper()), None)
 
     def inject_stock_data(self, ticker, dates, prices, price_lut=None):
         """Injects provided stock data into this market.
@@ -81,14 +271,41 @@ class Market(object):
                 and prices
         """
         ticker = ticker.upper()
+        self._forget_arrays_for(ticker)
         self.stocks_indicators[ticker] = {}
+        self.stock_tables.pop(ticker, None)
+        self._injected.add(ticker)
         if price_lut:
-            self.stocks[ticker] = price_lut
-            return
-        price_lut = {}
-        for i in range(0, len(dates)):
-            price_lut[dates[i]] = prices[i]
-        self.stocks[ticker] = price_lut
+            price_lut = {date_ordinal(date): price
+                         for (date, price) in price_lut.items()}
+        else:
+            price_lut = {}
+            for i in range(0, len(dates)):
+                price_lut[date_ordinal(dates[i])] = prices[i]
+        self._daily_luts[ticker] = price_lut
+        self.stocks[ticker] = self._resample_lut(price_lut)
+
+    def _resample_lut(self, lut):
+        """Internal function to resample a daily LUT to this Market's
+        frequency, keeping the last value of each period.
+
+        Args:
+            lut: A dictionary mapping dates to values
+
+        Returns:
+            A dictionary mapping the last day of each period with
+            values to the period's last value
+        """
+        if self.frequency == 'd':
+            return lut
+        resampled = {}
+        end = None
+        for date in sorted(lut.keys()):
+            if end is None or date > end:
+                end = PeriodFlags.period_end(datetime.date.fromordinal(date),
+                                             self.frequency).toordinal()
+            resampled[end] = lut[date]
+        return resampled
 
     def current_date(self):
         """Returns the current date of this Market.
@@ -96,9 +313,9 @@ class Market(object):
         Returns:
             A string representing the current date in this Market
         """
-        return date_str(self.date[1])
+        return self._date_strs[self.date[0]]
 
-    def query_stock(self, ticker, num_days=0):
+    def query_stock(self, ticker, num_days=0, column='close'):
         """Query a stock at the current date.
 
         Args:
@@ -106,22 +323,114 @@ class Market(object):
             num_days: A value representing the number of days of prices
                 going backwards from the current date to return. A
                 value of 0 means only a float for today's value will be
-                returned. A value >0 means an array of that many values
-                will be returned (default: 0)
+                returned. A value >0 means a list of up to that many
+                values will be returned, see also query_stock_window
+                (default: 0)
+            column: An OHLCV column to query, i.e. 'open', 'high',
+                'low', 'close' or 'volume' (default: 'close')
 
         Returns:
-            A float representing the price of the stock
+            A float representing the price of the stock, or a list of
+            floats ending at the current date
         """
-        ticker = ticker.upper()
         if num_days:
-            dates = self.dates[
-                max(0, self.date[0] - num_days + 1):self.date[0] + 1]
-            return [float(self.stocks[ticker][date]) for date in dates]
+            window = self.query_stock_window(ticker, num_days, column)
+            return None if window is None else window.tolist()
+        ticker = ticker.upper()
+        if column.lower() != 'close':
+            return self._query_stock_column(ticker, column, num_days)
+        if self._use_arrays and self.dates and ticker in self.stocks:
+            price = self._price_array(ticker)[self.date[0]]
+            if price != price:
+                print("NEEDS FIX: no data for " + ticker + " at "
+                      + self.current_date())
+                return None
+            return price
         try:
-            return float(self.stocks[ticker][self.current_date()])
+            return float(self.stocks[ticker][self.date[1]])
         except KeyError:
-            print("NEEDS FIX: no data for " + ticker + " at " + self.date[1])
+            print("NEEDS FIX: no data for " + ticker + " at "
+                  + self.current_date())
+            return None
+
+    def query_stock_window(self, ticker, num_days, column='close'):
+        """Query a stock's prices over a number of days up to the
+        current date, without copying them when this Market uses arrays
+        (e.g. for indicators over a lookback window at every date).
+
+        Args:
+            ticker: A ticker to query
+            num_days: A value >0 representing the number of days of
+                prices going backwards from the current date to return
+            column: An OHLCV column to query, i.e. 'open', 'high',
+                'low', 'close' or 'volume' (default: 'close')
+
+        Returns:
+            A read-only memoryview of up to num_days floats ending at
+            the current date, which is a view of this Market's prices
+            when it uses arrays
+        """
+        ticker = ticker.upper()
+        if column.lower() != 'close':
+            return self._query_stock_column(ticker, column, num_days)
+        i = self.date[0]
+        if self._use_arrays and self.dates and ticker in self.stocks:
+            return self._price_array(ticker)[max(0, i - num_days + 1):i + 1]
+        dates = self.dates[max(0, i - num_days + 1):i + 1]
+        return memoryview(array('d', [float(self.stocks[ticker][date])
+                                      for date in dates])).toreadonly()
+
+    def query_stock_table(self, ticker):
+        """Query the OHLCV data of a stock.
+
+        Args:
+            ticker: A ticker to query
+
+        Returns:
+            A PriceTable for the stock with the same days as its prices
+            (only trading days with a trading calendar, and only the
+            date range loaded), resampled to this Market's frequency.
+            It is empty for stocks that have no data on disk (e.g.
+            injected stocks)
+        """
+        ticker = ticker.upper()
+        if ticker not in self.stock_tables:
+            # bars are resampled from the days that traded only, so no
+            # filled day is counted in a bar's open, range or volume
+            table = self._db.build_price_table(
+                ticker,
+                fill=not self.trading_calendar and self.frequency == 'd',
+                date_range=self._loaded_ranges.get(ticker))
+            if self.frequency != 'd':
+                table = table.resample(self.frequency)
+            self.stock_tables[ticker] = table
+        return self.stock_tables[ticker]
+
+    def _query_stock_column(self, ticker, column, num_days):
+        """Internal function to query a stock's OHLCV column at the
+        current date.
+
+        Args:
+            ticker: A ticker to query
+            column: An OHLCV column to query
+            num_days: A value representing the number of days of
+                values going backwards from the current date to return,
+                same as in query_stock_window, or 0 for only today's
+
+        Returns:
+            A float, or a read-only view of floats for num_days
+        """
+        table = self.query_stock_table(ticker)
+        i = table.index_of(self.date[1])
+        if i is None:
+            print('NEEDS FIX: no {} data for {} at {}'.format(
+                column, ticker, self.current_date()))
             return None
+        values = table.column(column)
+        if num_days:
+            return memoryview(values).toreadonly()[
+                max(0, i - num_days + 1):i + 1]
+        return values[i]
 
     def query_stock_indicator(self, ticker, indicator):
         """Query a stock indicator value or set of values at the
@@ -138,63 +447,222 @@ class Market(object):
         """
         ticker = ticker.upper()
         indicator = indicator.upper()
+        if (self._use_arrays and self.dates
+                and indicator in self.stocks_indicators.get(ticker, {})):
+            value = self._indicator_array(ticker, indicator)[self.date[0]]
+            if value == value:
+                return value
         try:
             return float(
-                self.stocks_indicators[ticker][indicator][self.current_date()])
+                self.stocks_indicators[ticker][indicator][self.date[1]])
         except KeyError:
             print('NEEDS FIX: no {} value for {} at {}'.format(
                 indicator, ticker, self.current_date()))
             return None
 
     def set_date(self, date):
-        """Sets this Market to a given date.
+        """Sets this Market to a given date. A date this Market has no
+        data for snaps to the next date it does, or to its first or last
+        date if out of range.
 
         Args:
             date: A date to which to set this Market
         """
-        if date < self.dates[0]:
-            self.date = (0, self.dates[0])
-            return 0
-        if date > self.dates[-1]:
-            self.date = (len(self.dates) - 1, self.dates[-1])
-            return 0
-        try:
-            self.date = (self.dates.index(date), date)
-            return 0
-        except ValueError:
-            print("NEEDS FIX: date does not exist")
-            return 1
+        date = self._date_key(date)
+        i = self._date_indices.get(date)
+        if i is None:
+            i = min(bisect_left(self.dates, date), len(self.dates) - 1)
+        self.date = (i, self.dates[i])
+        self.new_period.index = None
+        return 0
 
     def set_default_dates(self):
         """Sets a default range for this Market's dates.
 
         Based on existing stocks in this Market, decides an appropriate
-        range in which all stocks have prices.
-        """
-        date_range = (date_str(dt.fromordinal(1)),
-                      date_str(dt.fromordinal(999999)))
-        for price_lut in self.stocks.values():
-            dates = sorted(price_lut.keys())
-            date_range = (max(date_range[0], dates[0]), min(
-                date_range[1], dates[-1]))
-            date_idxs = (dates.index(
-                date_range[0]), dates.index(date_range[1]))
-            self.dates = dates[date_idxs[0]:date_idxs[1] + 1]
+        range in which all stocks have prices. The range of stocks
+        loaded from disk comes from the DataManager's manifest. Within
+        the range, the dates are the days of the stocks loaded from
+        disk (or of all stocks, if none are), aligned with the policy
+        set by use_alignment.
+        """
+        date_range = (1, datetime.date.max.toordinal())
+        for ticker in self.stocks.keys():
+            (first, last) = self._date_range_of(ticker)
+            date_range = (max(date_range[0], first),
+                          min(date_range[1], last))
+        tickers = ([ticker for ticker in self.stocks.keys()
+                    if ticker not in self._injected]
+                   or list(self.stocks.keys()))
+        alignment = Alignment(self.stocks, self._alignment, date_range,
+                              tickers)
+        self._set_dates(alignment.dates)
+        self.alignment = alignment
+        if self._use_arrays:
+            for (ticker, prices) in alignment.arrays.items():
+                self._price_arrays[ticker] = memoryview(prices).toreadonly()
+
+    def get_stocks_date_range(self, tickers):
+        """Returns the range of dates in which a set of stocks all
+        have prices, without loading stocks which aren't in this Market
+        (their ranges come from the DataManager's manifest).
+
+        Args:
+            tickers: An array of tickers
+
+        Returns:
+            A tuple of (first, last) date strings
+        """
+        ranges = [self._date_range_of(ticker.upper()) for ticker in tickers]
+        return (date_str(max(first for (first, _) in ranges)),
+                date_str(min(last for (_, last) in ranges)))
+
+    def get_date_range(self):
+        """Returns the first and last date of this Market.
+
+        Returns:
+            A tuple of (first, last) date strings
+        """
+        return (self._date_strs[0], self._date_strs[-1])
+
+    def _set_dates(self, dates, previous=None):
+        """Internal function to set this Market's dates and move it to
+        the first one.
+
+        Args:
+            dates: An array of dates, in chronological order
+            previous: (optional) The date before the first, if the dates
+                continue earlier ones, see PeriodFlags
+        """
+        self.dates = dates
         self.date = (0, self.dates[0])
+        self._date_indices = {date: i for (i, date) in enumerate(dates)}
+        self._date_strs = self._date_strs_for(dates)
+        self.new_period = PeriodFlags(dates, previous)
+        self._price_arrays = {}
+        self._indicator_arrays = {}
+
+    def _date_key(self, date):
+        """Internal function to convert a date to the type of this
+        Market's dates.
+
+        Args:
+            date: A date string, ordinal or object
+
+        Returns:
+            A date ordinal
+        """
+        return date_ordinal(date)
+
+    def _date_strs_for(self, dates):
+        """Internal function to get the strings for a set of this
+        Market's dates, as returned by current_date.
+
+        Args:
+            dates: An array of date ordinals
+
+        Returns:
+            An array of date strings, aligned with dates
+        """
+        return date_strs_for(dates)
+
+    def _forget_arrays_for(self, ticker):
+        """Internal function to drop the arrays built for a stock and
+        its indicators, after its data changes.
+
+        Args:
+            ticker: A ticker of a stock in this Market
+        """
+        self._price_arrays.pop(ticker, None)
+        for key in [key for key in self._indicator_arrays.keys()
+                    if key[0] == ticker]:
+            del self._indicator_arrays[key]
+
+    def _price_array(self, ticker):
+        """Internal function to get a stock's prices as an array
+        aligned with this Market's dates, building it if needed.
+
+        Args:
+            ticker: A ticker of a stock in this Market
+
+        Returns:
+            A read-only view of floats, NaN where there is no price
+        """
+        prices = self._price_arrays.get(ticker)
+        if prices is None:
+            prices = self._aligned_array(self.stocks[ticker])
+            self._price_arrays[ticker] = prices
+        return prices
+
+    def _indicator_array(self, ticker, indicator):
+        """Internal function to get a stock's indicator values as an
+        array aligned with this Market's dates, building it if needed.
+
+        Args:
+            ticker: A ticker of a stock in this Market
+            indicator: An indicator added for the stock
+
+        Returns:
+            A read-only view of floats, NaN where there is no value
+        """
+        values = self._indicator_arrays.get((ticker, indicator))
+        if values is None:
+            values = self._aligned_array(
+                self.stocks_indicators[ticker][indicator])
+            self._indicator_arrays[(ticker, indicator)] = values
+        return values
+
+    def _aligned_array(self, lut):
+        """Internal function to convert a LUT to an array aligned with
+        this Market's dates. The array is returned as a read-only view,
+        which lookback windows are sliced from without copying.
+
+        Args:
+            lut: A dictionary mapping dates to values
+
+        Returns:
+            A read-only view of floats, NaN for dates missing from the
+            LUT unless the alignment policy fills them
+        """
+        return memoryview(Alignment.align(lut, self.dates,
+                                          self._alignment)).toreadonly()
+
+    def _date_range_of(self, ticker):
+        """Internal function to get the first and last date of a
+        stock's prices.
+
+        Args:
+            ticker: A ticker of a stock in this Market
+
+        Returns:
+            A tuple of (first, last) date ordinals
+        """
+        if ticker not in self._injected and self.frequency == 'd':
+            (first, last) = self._db.get_date_range(ticker)
+            (start, end) = self._loaded_ranges.get(ticker) or (None, None)
+            if first is not None:
+                (first, last) = (date_ordinal(first), date_ordinal(last))
+                return (max(first, date_ordinal(start or first)),
+                        min(last, date_ordinal(end or last)))
+        return (min(self.stocks[ticker].keys()),
+                max(self.stocks[ticker].keys()))
 
     def advance_day(self):
         """Advances this Market's date by one day."""
         self.date = (self.date[0] + 1, self.dates[self.date[0] + 1])
-        self._raise_period_flags()
-
-    def _raise_period_flags(self):
-        """Internal function to handle setting flags at new periods."""
-        last_date = date_obj(self.dates[self.date[0] - 1])
-        curr_date = date_obj(self.date[1])
-        self.new_period = {'m': False, 'q': False, 'y': False}
-        if last_date.year < curr_date.year:
-            self.new_period = {'m': True, 'q': True, 'y': True}
-        elif last_date.month != curr_date.month:
-            self.new_period['m'] = True
-            if (curr_date.month - 1) % 3 == 0:
-                self.new_period['q'] = True
+        self.new_period.index = self.date[0]
+
+    def is_new_period(self, period, i=None):
+        """Returns whether a date of this Market starts a new period.
+
+        Args:
+            period: A period, i.e. 'w', 'm', 'q' or 'y'
+            i: (optional) An index into this Market's dates, default:
+                the current date's index
+
+        Returns:
+            True if the date starts a new period
+        """
+        if i is None:
+            i = self.date[0]
+        return self.new_period.at(period, i)
@@ -1,4 +1,3 @@
-from datetime import timedelta
 from math import sqrt
 
 from utils import date_obj
@@ -88,7 +87,7 @@ class Monitor(object):
     def take_snapshot(self):
         """Records a snapshot of all supported stats for the Portfolio
         at the current date."""
-        self._dates.append(self.market.current_date())
+        self._dates.append(self.market.date[1])
         self._record_portfolio_value()
         self._record_asset_allocation()
         self._record_contribution_vs_growth()
@@ -134,14 +133,14 @@ class Monitor(object):
 
     def _record_portfolio_value(self):
         """Internal method for recording the Portfolio value."""
-        (curr_year, curr_month, _) = self.market.current_date().split('-')
-        self._daily_value_history[self.market.current_date()] \
+        curr_date = self.market.current_date()
+        self._daily_value_history[self.market.date[1]] \
             = self.portfolio.value()
         if self.market.new_period['m'] or not len(self._monthly_value_history):
-            self._monthly_value_history[curr_year + '-' + curr_month] \
+            self._monthly_value_history[curr_date[:7]] \
                 = self.portfolio.value()
         if self.market.new_period['y'] or not len(self._annual_value_history):
-            self._annual_value_history[curr_year] \
+            self._annual_value_history[curr_date[:4]] \
                 = self.portfolio.value()
 
     def _record_asset_allocation(self):
@@ -154,7 +153,7 @@ class Monitor(object):
             else:
                 alloc[asset] = (self.market.query_stock(asset) * int(shares)
                                 / self.portfolio.value())
-        self._asset_alloc_history[self.market.current_date()] = alloc
+        self._asset_alloc_history[self.market.date[1]] = alloc
 
     def _record_contribution_vs_growth(self):
         """Internal method for recording the percentages of the
@@ -164,19 +163,16 @@ class Monitor(object):
             ratio['contrib'] = (self.portfolio.total_contributions
                                 / self.portfolio.value())
             ratio['growth'] = max(0, 1 - ratio['contrib'])
-        self._contrib_vs_growth_history[self.market.current_date()] = ratio
+        self._contrib_vs_growth_history[self.market.date[1]] = ratio
 
     def _record_monthly_return(self):
         """Internal method for recording the Portfolio's monthly
-        returns."""
+        returns. With bars longer than a month (e.g. quarterly), the
+        return is since the last month with a bar."""
         if (not self.market.new_period['m']
                 or len(self._monthly_value_history) <= 1):
             return
-        this_dt = date_obj(self.market.current_date())
-        last_dt = (date_obj(self.market.current_date()).replace(day=1)
-                   - timedelta(1))
-        this_month = str(this_dt.year) + '-' + ('0' + str(this_dt.month))[-2:]
-        last_month = str(last_dt.year) + '-' + ('0' + str(last_dt.month))[-2:]
+        (this_month, last_month) = list(self._monthly_value_history)[-1:-3:-1]
         self._monthly_returns[last_month] = \
             (self._monthly_value_history[this_month]
              / self._monthly_value_history[last_month]
@@ -188,7 +184,7 @@ class Monitor(object):
         if (not self.market.new_period['y']
                 or len(self._annual_value_history) <= 1):
             return
-        (this_year, _, _) = self.market.current_date().split('-')
+        this_year = self.market.current_date()[:4]
         last_year = str(int(this_year) - 1)
         self._annual_returns[last_year] = \
             (self._annual_value_history[this_year]
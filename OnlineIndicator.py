@@ -0,0 +1,183 @@
+from collections import deque
+
+
+class OnlineIndicator(object):
+
+    """An indicator updated one price at a time, e.g. for appending
+    today's bar to a live chart or a paper trading loop without
+    recomputing the whole history.
+
+    Each update takes O(1) time, and after the same prices an online
+    indicator has exactly the value of the batch version in Calculator
+    (the same floating-point operations are done in the same order).
+    Use Calculator.get_online_indicator to get one from an indicator
+    code.
+
+    NOTE: To add an online indicator, subclass OnlineIndicator with an
+        update method, and add it to the mapping in
+        Calculator.get_online_indicator.
+
+    Attributes:
+        value: The value after the last update, None before any
+    """
+
+    def __init__(self):
+        """Initializes an OnlineIndicator without any prices."""
+        self.value = None
+
+    def update(self, price):
+        """Updates this OnlineIndicator with the next price.
+
+        Args:
+            price: A price following all previous ones
+
+        Returns:
+            The updated value
+        """
+        raise NotImplementedError
+
+    def update_all(self, prices):
+        """Updates this OnlineIndicator with a number of prices, e.g.
+        the price history to start from.
+
+        Args:
+            prices: An array of prices, in chronological order
+
+        Returns:
+            The updated value
+        """
+        for price in prices:
+            self.update(price)
+        return self.value
+
+
+class OnlineSMA(OnlineIndicator):
+
+    """A Standard Moving Average, see Calculator.get_sma."""
+
+    def __init__(self, period):
+        """Initializes an OnlineSMA.
+
+        Args:
+            period: A value representing a number of days
+        """
+        super(OnlineSMA, self).__init__()
+        self.period = int(period)
+        self._window = deque()
+        self._total = 0.0
+
+    def update(self, price):
+        """Updates this OnlineSMA with the next price, see
+        OnlineIndicator.update."""
+        self._window.append(price)
+        if len(self._window) > self.period:
+            # same running sum as Calculator._sma_values
+            self._total += price - self._window.popleft()
+            self.value = self._total / self.period
+        else:
+            self._total += price
+            self.value = self._total / len(self._window)
+        return self.value
+
+
+class OnlineEMA(OnlineIndicator):
+
+    """An Exponential Moving Average, see Calculator.get_ema. Until
+    there are period prices, the value is their average."""
+
+    def __init__(self, period):
+        """Initializes an OnlineEMA.
+
+        Args:
+            period: A value representing a number of days
+        """
+        super(OnlineEMA, self).__init__()
+        self.period = int(period)
+        self._count = 0
+        self._total = 0.0
+        self._multiplier = 2 / (self.period + 1)
+
+    def update(self, price):
+        """Updates this OnlineEMA with the next price, see
+        OnlineIndicator.update."""
+        self._count += 1
+        if self._count <= self.period:
+            self._total += price
+            self.value = self._total / self._count
+        else:
+            self.value = (float(price) * self._multiplier
+                          + self.value * (1 - self._multiplier))
+        return self.value
+
+
+class OnlineMACD(OnlineIndicator):
+
+    """A Moving Average Convergence/Divergence, see
+    Calculator.get_macd."""
+
+    def __init__(self, periods):
+        """Initializes an OnlineMACD.
+
+        Args:
+            periods: A set of values representing the days for each
+                MACD period, i.e. [short, long, exponential/signal]
+        """
+        super(OnlineMACD, self).__init__()
+        self._short = OnlineEMA(periods[0])
+        self._long = OnlineEMA(periods[1])
+
+    def update(self, price):
+        """Updates this OnlineMACD with the next price, see
+        OnlineIndicator.update."""
+        self.value = self._short.update(price) - self._long.update(price)
+        return self.value
+
+
+class OnlineMACDSignal(OnlineIndicator):
+
+    """The signal line of a Moving Average Convergence/Divergence, see
+    Calculator.get_macd_signal.
+
+    Attributes:
+        macd: The OnlineMACD the signal line is the EMA of
+    """
+
+    def __init__(self, periods):
+        """Initializes an OnlineMACDSignal.
+
+        Args:
+            periods: A set of values representing the days for each
+                MACD period, i.e. [short, long, exponential/signal]
+        """
+        super(OnlineMACDSignal, self).__init__()
+        self.macd = OnlineMACD(periods)
+        self._signal = OnlineEMA(periods[2])
+
+    def update(self, price):
+        """Updates this OnlineMACDSignal with the next price, see
+        OnlineIndicator.update."""
+        self.value = self._signal.update(self.macd.update(price))
+        return self.value
+
+
+class OnlinePrevHigh(OnlineIndicator):
+
+    """The highest price so far, including the current one, see
+    Calculator.get_prev_high."""
+
+    def __init__(self, period=None):
+        """Initializes an OnlinePrevHigh.
+
+        Args:
+            period: A placeholder, just pass None for now
+        """
+        super(OnlinePrevHigh, self).__init__()
+
+    def update(self, price):
+        """Updates this OnlinePrevHigh with the next price, see
+        OnlineIndicator.update."""
+        if self.value is None:
+            self.value = price
+        else:
+            self.value = max(price, self.value)
+        return self.value
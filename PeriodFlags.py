@@ -0,0 +1,113 @@
+import calendar
+import datetime
+from array import array
+from collections.abc import Mapping
+
+from utils import date_obj
+
+
+class PeriodFlags(Mapping):
+
+    """Flags for which periods start at each date of a date axis.
+
+    The boundaries are computed once, as arrays of booleans aligned with
+    the dates, so checking for a new period needs no date parsing. Read
+    as a map (e.g. flags['m']), gives the flags at the current index.
+
+    Attributes:
+        starts: A map of periods (see PERIODS) to arrays of booleans,
+            true at indices whose date starts a new period
+        index: An index into the dates for which the map gives flags,
+            or None if no period has just started
+    """
+
+    PERIODS = ('w', 'm', 'q', 'y')
+
+    def __init__(self, dates=(), previous=None):
+        """Initializes PeriodFlags for a date axis.
+
+        Args:
+            dates: (optional) An array of dates, in chronological order
+            previous: (optional) The date before the first, if the axis
+                continues an earlier one, so that periods starting at
+                the first date are flagged too
+        """
+        self.starts = {}
+        for period in PeriodFlags.PERIODS:
+            self.starts[period] = array('b', [0]) * len(dates)
+        self.index = None
+        keys = [PeriodFlags._period_keys(date_obj(date)) for date in dates]
+        if previous is not None and keys:
+            keys.insert(0, PeriodFlags._period_keys(date_obj(previous)))
+            offset = 1
+        else:
+            offset = 0
+        for i in range(1, len(keys)):
+            for (period, last_key, curr_key) in zip(
+                    PeriodFlags.PERIODS, keys[i - 1], keys[i]):
+                if last_key != curr_key:
+                    self.starts[period][i - offset] = 1
+
+    def at(self, period, i):
+        """Returns whether a period starts at an index.
+
+        Args:
+            period: A period, i.e. 'w', 'm', 'q' or 'y'
+            i: An index into the dates
+
+        Returns:
+            True if the date at the index starts a new period
+        """
+        return bool(self.starts[period][i])
+
+    def __getitem__(self, period):
+        if self.index is None:
+            if period not in self.starts:
+                raise KeyError(period)
+            return False
+        return self.at(period, self.index)
+
+    def __iter__(self):
+        return iter(PeriodFlags.PERIODS)
+
+    def __len__(self):
+        return len(PeriodFlags.PERIODS)
+
+    @staticmethod
+    def period_end(date, period):
+        """Returns the last day of the period a date falls in, with
+        weeks running from Monday to Sunday.
+
+        Args:
+            date: A date object
+            period: A period, i.e. 'w', 'm', 'q' or 'y'
+
+        Returns:
+            A date object
+        """
+        if period == 'w':
+            return date + datetime.timedelta(6 - date.weekday())
+        if period == 'm':
+            month = date.month
+        elif period == 'q':
+            month = (date.month - 1) // 3 * 3 + 3
+        elif period == 'y':
+            month = 12
+        else:
+            raise ValueError('unknown period: {}'.format(period))
+        return datetime.date(date.year, month,
+                             calendar.monthrange(date.year, month)[1])
+
+    @staticmethod
+    def _period_keys(date):
+        """Internal function to get the week, month, quarter and year a
+        date falls in.
+
+        Args:
+            date: A date object
+
+        Returns:
+            A tuple of keys, one per period in PERIODS
+        """
+        return (date.isocalendar()[:2], (date.year, date.month),
+                (date.year, (date.month - 1) // 3), date.year)
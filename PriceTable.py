@@ -0,0 +1,158 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+import datetime
+
+from utils import date_ordinal
+from utils import date_strs_for
+
+from PeriodFlags import PeriodFlags
+
+
+class PriceTable(object):
+
+    """A table of OHLCV data for a stock, stored column by column.
+
+    Every column is a contiguous array of floats sharing one date
+    index, so a whole column can be used at once (e.g. for volume or
+    range based indicators) without building per-date dictionaries.
+
+    Attributes:
+        dates: An array of date ordinals, in chronological order
+        columns: A map of column names (see COLUMNS) to arrays of
+            floats, each aligned with dates
+    """
+
+    COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, dates=None, columns=None):
+        """Initializes a PriceTable.
+
+        Args:
+            dates: (optional) An array of date ordinals
+            columns: (optional) A map of column names to arrays of
+                floats aligned with dates, missing columns are empty
+        """
+        self.dates = dates if dates is not None else array('q')
+        self.columns = {}
+        for name in PriceTable.COLUMNS:
+            self.columns[name] = array('d')
+        if columns:
+            self.columns.update(columns)
+        self._luts = {}
+
+    def __len__(self):
+        """Returns the number of rows in this PriceTable."""
+        return len(self.dates)
+
+    def __sizeof__(self):
+        """Returns the memory footprint of this PriceTable's arrays."""
+        return (object.__sizeof__(self) + sys.getsizeof(self.dates)
+                + sum(sys.getsizeof(c) for c in self.columns.values())
+                + sum(sys.getsizeof(lut) for lut in self._luts.values()))
+
+    def column(self, name):
+        """Returns a column of this PriceTable.
+
+        Args:
+            name: A column name, e.g. 'close'
+
+        Returns:
+            An array of floats aligned with this PriceTable's dates
+        """
+        return self.columns[name.lower()]
+
+    def date_strs(self):
+        """Returns this PriceTable's dates as date strings.
+
+        Returns:
+            An array of date strings aligned with this PriceTable's rows
+        """
+        return date_strs_for(self.dates)
+
+    def index_of(self, date):
+        """Returns the row index for a date.
+
+        Args:
+            date: A date ordinal, string or object
+
+        Returns:
+            A row index, or None if there is no row for the date
+        """
+        date = date_ordinal(date)
+        i = bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            return i
+        return None
+
+    def slice(self, start, stop):
+        """Returns a new PriceTable with a range of this PriceTable's
+        rows.
+
+        Args:
+            start: A row index for the first row to include
+            stop: A row index for the first row to exclude
+
+        Returns:
+            A PriceTable
+        """
+        columns = {}
+        for (name, values) in self.columns.items():
+            columns[name] = values[start:stop]
+        return PriceTable(self.dates[start:stop], columns)
+
+    def resample(self, period):
+        """Returns a new PriceTable with one bar per period, dated at
+        the last day of the period. A bar opens at the period's first
+        open, closes at its last close, spans its highs and lows, and
+        sums its volume.
+
+        Args:
+            period: A period, i.e. 'w', 'm', 'q' or 'y'
+
+        Returns:
+            A PriceTable
+        """
+        table = PriceTable()
+        (opens, highs, lows, closes, volumes) = [
+            self.column(name) for name in PriceTable.COLUMNS]
+        end = None
+        for i in range(len(self.dates)):
+            if end is None or self.dates[i] > end:
+                end = PeriodFlags.period_end(
+                    datetime.date.fromordinal(self.dates[i]),
+                    period).toordinal()
+                table.dates.append(end)
+                table.columns['open'].append(opens[i])
+                table.columns['high'].append(highs[i])
+                table.columns['low'].append(lows[i])
+                table.columns['close'].append(closes[i])
+                table.columns['volume'].append(volumes[i])
+                continue
+            table.columns['high'][-1] = max(table.columns['high'][-1],
+                                            highs[i])
+            table.columns['low'][-1] = min(table.columns['low'][-1],
+                                           lows[i])
+            table.columns['close'][-1] = closes[i]
+            table.columns['volume'][-1] += volumes[i]
+        return table
+
+    def lut(self, name='close'):
+        """Returns a lookup table for a column of this PriceTable, in
+        the same format as DataManager.build_price_lut. The table is
+        built once per column, so e.g. Calculator's memo of indicators
+        by LUT also applies to a PriceTable.
+
+        Args:
+            name: (optional) A column name, default: 'close'
+
+        Returns:
+            A dictionary with date ordinals as keys and values of the
+            column as values, which is shared with later calls, so it
+            must not be modified
+        """
+        name = name.lower()
+        if name not in self._luts:
+            self._luts[name] = dict(zip(self.dates, self.column(name)))
+        return self._luts[name]
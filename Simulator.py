@@ -2,7 +2,8 @@ import datetime
 from datetime import datetime as dt
 
 from utils import date_str
-from utils import date_obj
+from utils import date_ordinal
+from utils import peak_memory
 
 from Calculator import Calculator
 
@@ -26,11 +27,20 @@ class Simulator(object):
 
     Attributes:
         dates_testing: A tuple indicating a range of dates to test
+        frequency: The period of the bars to simulate, i.e. 'd', 'w',
+            'm' or 'q', or None to use the Market's
+        block_days: A number of days to simulate at a time, loading
+            only their prices, or None to load all prices at once
+        peak_memory: The peak memory use of the process in bytes, as
+            of the end of the last simulation (None if unknown)
 
     Todo:
         - [new feature] multiple portfolios/traders
     """
 
+    # most calendar days in a bar of each frequency
+    BAR_DAYS = {'w': 7, 'm': 31, 'q': 92}
+
     def __init__(self):
         """Initializes an empty simulator."""
         self._calc = Calculator()
@@ -39,7 +49,11 @@ class Simulator(object):
         self._monitor = None
         self._stocks = set({})
         self._indicators = set({})
+        self._indicator_pairs = set({})
         self.dates_testing = (None, None)
+        self.frequency = None
+        self.block_days = None
+        self.peak_memory = None
 
     def add_trader(self, trader):
         """Sets the Trader for this Simulator.
@@ -65,6 +79,15 @@ class Simulator(object):
         """
         self._monitor = monitor
 
+    def use_calculator(self, calc):
+        """Sets the Calculator this Simulator computes indicators with,
+        e.g. one using the indicator cache.
+
+        Args:
+            calc: A Calculator instance to use
+        """
+        self._calc = calc
+
     def use_stocks(self, tickers):
         """Adds a set of stocks to the stocks with which to populate
         the Market.
@@ -79,9 +102,17 @@ class Simulator(object):
         populate the Market.
 
         Args:
-            indicators: A set of indicators
+            indicators: A set of indicators, each either an indicator
+                code to compute for every stock, or a (ticker,
+                indicator) tuple to compute for one stock only, as
+                returned by DataManager.build_strategy
         """
-        self._indicators |= set(indicators)
+        for indicator in indicators:
+            if isinstance(indicator, tuple):
+                (ticker, indicator) = indicator
+                self._indicator_pairs.add((ticker.upper(), indicator.upper()))
+            else:
+                self._indicators.add(indicator)
 
     def set_start_date(self, date):
         """Sets the start date for this Simulator.
@@ -99,53 +130,258 @@ class Simulator(object):
         """
         self.dates_testing = (self.dates_testing[0], date_str(date))
 
+    def set_frequency(self, frequency):
+        """Sets the period of the bars this Simulator steps over, e.g.
+        'm' to run strategies that only act monthly on monthly bars.
+        Indicators are then computed on the resampled prices, with
+        their periods counted in bars. Applied to the Market right away
+        if it's set, so stocks injected into it are resampled too.
+
+        Args:
+            frequency: A period, i.e. 'd', 'w', 'm' or 'q'
+        """
+        self.frequency = frequency
+        if self._market is not None:
+            self._market.use_frequency(frequency)
+
+    def set_block_size(self, days):
+        """Sets this Simulator to simulate a number of days at a time.
+        Only the prices of the current block of days (plus as many days
+        before it as the indicators need) are in memory, so a universe
+        of many stocks over many years can be simulated with bounded
+        memory. Every indicator must have a limited lookback (see
+        Calculator.get_lookback), and bars must be daily.
+
+        Note that loaded prices are also kept in the DataManager's
+        price_cache, up to its max_bytes, while the indicators of each
+        block are never kept in the indicator cache (see
+        Calculator.use_indicator_cache).
+
+        Args:
+            days: A number of days per block, or None to load all
+                prices at once
+        """
+        self.block_days = days
+
     def remove_date_limits(self):
         """Removes any date range for this Simulator."""
         self.dates_testing = (None, None)
 
     def simulate(self):
         """Runs this Simulator with the current configuration."""
+        if (not self._market.SUPPORTS_INDICATORS
+                and (self._indicators or self._indicator_pairs)):
+            raise ValueError('the Market does not support indicators, '
+                             'use a strategy without them')
+        if self.block_days:
+            self._simulate_blocks()
+            self.peak_memory = peak_memory()
+            return
         self._init_market()
         self._init_dates()
         self._init_trader()
         self._monitor.init_stats()
-        while self._market.current_date() < self.dates_testing[1]:
+        self._simulate_until(self.dates_testing[1])
+        self.peak_memory = peak_memory()
+
+    def _simulate_until(self, date):
+        """Internal function to advance the Market day by day up to a
+        date, making the Trader react and the Monitor record each day.
+
+        Args:
+            date: A date to stop at
+        """
+        while self._market.current_date() < date:
             self._market.advance_day()
             self._trader.adjust_portfolio()
             self._monitor.take_snapshot()
 
+    def _simulate_blocks(self):
+        """Internal function to run this Simulator one block of days
+        at a time, see set_block_size.
+
+        Each block reloads the Market's stocks for its days, from the
+        last day of the previous block (so that the Market advances
+        into the block as usual) minus the indicators' lookback.
+        """
+        if (self.frequency or self._market.frequency) != 'd':
+            raise ValueError('only daily bars can be simulated in blocks')
+        if self._lookback_bars() is None:
+            raise ValueError('indicators depending on the full price '
+                             'history cannot be simulated in blocks')
+        preloaded = set(self._market.stocks.keys())
+        tickers = [asset for asset in sorted(self._stocks)
+                   if asset not in preloaded]
+        (first, last) = self._market.get_stocks_date_range(
+            sorted(self._stocks))
+        start = max(self.dates_testing[0] or first, first)
+        end = min(self.dates_testing[1] or last, last)
+        previous = None
+        while True:
+            block_end = min(end, date_str(date_ordinal(start)
+                                          + self.block_days - 1))
+            self._add_stocks(tickers, previous or start, block_end)
+            self._add_indicators(
+                self._stocks if previous is None else tickers)
+            self._market.set_default_dates()
+            if previous is None:
+                self._market.set_date(start)
+                self.dates_testing = (self._market.current_date(), end)
+                self._init_trader()
+                self._monitor.init_stats()
+            else:
+                self._market.set_date(previous)
+            self._simulate_until(self._market.get_date_range()[1])
+            previous = self._market.current_date()
+            if block_end >= end:
+                return
+            start = date_str(date_ordinal(block_end) + 1)
+
     def _init_market(self):
         """Initializes/resets the Market to work with the current
         Simulator setup.
 
         Specifically, adds all stocks to the Market and resets the
-        Market's dates. Then, adds all relevant indicators."""
-        for asset in self._stocks:
-            if asset not in self._market.stocks.keys():
-                self._market.add_stocks([asset])
-            for indicator in self._indicators:
+        Market's dates. Then, adds all relevant indicators.
+
+        Only the prices needed for the testing dates are loaded: none
+        after the end date, and before the start date only as many
+        days as the indicators need to warm up (all of them, if an
+        indicator depends on the full history). With a Market on a
+        trading calendar, indicator periods count trading days."""
+        if self.frequency:
+            self._market.use_frequency(self.frequency)
+        self._add_stocks([asset for asset in sorted(self._stocks)
+                          if asset not in self._market.stocks.keys()],
+                         self.dates_testing[0], self.dates_testing[1])
+        self._add_indicators(self._stocks)
+        self._market.set_default_dates()    
+
+    def _add_indicators(self, assets):
+        """Internal function to compute all indicators for a set of
+        stocks from their prices in the Market, and add them to it.
+
+        Args:
+            assets: A set of tickers
+        """
+        # a block's prices are a window of the history, so with
+        # block_days every block would add its own indicator cache
+        # entries, which are never read again: don't cache them
+        cache = not self.block_days
+        for asset in assets:
+            for indicator in self._indicators_for(asset):
                 self._market.add_indicator(
                     asset,
                     indicator,
                     self._calc.get_indicator(indicator,
-                                             self._market.stocks[asset]))
-        self._market.set_default_dates()    
+                                             self._market.stocks[asset],
+                                             ticker=asset if cache else None))
+
+    def _indicators_for(self, asset):
+        """Internal function to get the indicators to compute for a
+        stock.
+
+        Args:
+            asset: A ticker
+
+        Returns:
+            A set of indicators
+        """
+        return self._indicators | {indicator for (ticker, indicator)
+                                   in self._indicator_pairs
+                                   if ticker == asset.upper()}
+
+    def _add_stocks(self, tickers, start, end):
+        """Internal function to add stocks to the Market, with their
+        prices up to an end date and, before a start date, as many
+        bars as the indicators need to warm up (all of them, if an
+        indicator depends on the full history).
+
+        The calendar days needed for those bars are only estimated
+        (see _lookback_days), so stocks with fewer bars before the
+        start date than the indicators' lookback are loaded again from
+        twice as far back, until they have enough or there are no
+        earlier prices.
+
+        Args:
+            tickers: An array of tickers
+            start: A date from which indicator values are needed, or
+                None to load prices from the start of the data
+            end: A date up to which to load prices, or None
+        """
+        days = self._lookback_days() if start else None
+        if days is None:
+            self._market.add_stocks(tickers, (None, end))
+            return
+        bars = self._lookback_bars()
+        start = date_ordinal(start)
+        counts = {}
+        while True:
+            self._market.add_stocks(
+                tickers, (date_str(max(1, start - days)), end))
+            short = []
+            for ticker in tickers:
+                count = sum(1 for date in self._market.stocks[ticker.upper()]
+                            if date < start)
+                if count < bars and count != counts.get(ticker):
+                    short.append(ticker)
+                counts[ticker] = count
+            tickers = short
+            if not tickers:
+                return
+            days *= 2
+
+    def _lookback_bars(self):
+        """Returns how many bars of prices before a date the
+        indicators need to have their values at that date.
+
+        Returns:
+            A number of bars, or None if an indicator depends on the
+            full price history
+        """
+        lookbacks = [self._calc.get_lookback(indicator)
+                     for indicator in (self._indicators
+                                       | {indicator for (_, indicator)
+                                          in self._indicator_pairs})]
+        if None in lookbacks:
+            return None
+        return max(lookbacks + [0])
+
+    def _lookback_days(self):
+        """Returns how many calendar days of prices before a date the
+        indicators need to have their values at that date, which is an
+        estimate unless bars are daily on the calendar.
+
+        Returns:
+            A number of days, or None if an indicator depends on the
+            full price history
+        """
+        lookback = self._lookback_bars()
+        if lookback is None:
+            return None
+        if self._market.frequency != 'd':
+            # bars to calendar days, with room for a partial bar
+            return (lookback + 1) * Simulator.BAR_DAYS[self._market.frequency]
+        if self._market.trading_calendar:
+            # trading days to calendar days, with room for holidays
+            return lookback * 3 // 2 + 10
+        return lookback
 
     def _init_dates(self):
         """Initializes/resets the testing dates for this Simulator.
 
         Specifically, aligns the Simulator's dates with the Market's
         dates."""
-        if (not self.dates_testing[0]
-                or self.dates_testing[0] < self._market.dates[0]):
-            self.dates_testing = (self._market.dates[0],
-                                  self.dates_testing[1])
+        (first, last) = self._market.get_date_range()
+        if not self.dates_testing[0] or self.dates_testing[0] < first:
+            self.dates_testing = (first, self.dates_testing[1])
         else:
             self._market.set_date(self.dates_testing[0])
-        if (not self.dates_testing[1]
-                or self.dates_testing[1] > self._market.dates[-1]):
-            self.dates_testing = (self.dates_testing[0],
-                                  self._market.dates[-1])
+        end = self.dates_testing[1]
+        # an end date without a time (e.g. with an IntradayMarket of
+        # timestamped bars) includes every bar of that day
+        if not end or end >= last[:len(end)]:
+            self.dates_testing = (self.dates_testing[0], last)
 
     def _init_trader(self):
         """Initializes/resets the Trader(s) for this Simulator.
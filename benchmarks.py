@@ -0,0 +1,216 @@
+#!/usr/bin/python
+
+"""Benchmarks for performance sensitive parts of the backtester.
+
+Each benchmark runs on synthetic data written to a temporary directory,
+checks that the optimized code gives the same output as a reference
+implementation, and prints the best time of a few runs of each.
+
+Usage:
+    python benchmarks.py [benchmark ...]
+"""
+
+import argparse
+import datetime
+import os.path
+import random
+import tempfile
+import timeit
+
+from utils import date_ordinal
+
+from Calculator import Calculator
+from DataManager import DataManager
+
+######
+# HELPERS
+#####
+
+
+def write_synthetic_csv(data_location, ticker, years, seed=0):
+    """Writes a CSV file of random daily prices for weekdays, skipping
+    a few days as holidays.
+
+    Args:
+        data_location: A string for the data dir to write to
+        ticker: A string for the ticker of the file
+        years: A value for the number of years of data
+        seed: (optional) A seed for the random prices
+
+    Returns:
+        Number of lines written
+    """
+    rand = random.Random(seed)
+    date = datetime.date(2020 - years, 1, 1)
+    price = 100.0
+    written = 0
+    with open(os.path.join(data_location, ticker + '.csv'), 'w') as file:
+        while date < datetime.date(2020, 1, 1):
+            if date.weekday() < 5 and rand.random() > 0.03:
+                price *= 1 + rand.gauss(0.0003, 0.01)
+                file.write('{},{:.2f},{:.2f},{:.2f},{:.2f},{}\n'.format(
+                    date.isoformat(), price, price * 1.01, price * 0.99,
+                    price, rand.randint(1000, 100000)))
+                written += 1
+            date += datetime.timedelta(1)
+    return written
+
+
+def best_time(func, repeat=5):
+    """Returns the best time in seconds of a few calls of a function.
+
+    Args:
+        func: A function taking no arguments
+        repeat: (optional) A number of calls to time
+
+    Returns:
+        A value in seconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def report(name, reference, optimized):
+    """Prints the times for a reference and optimized implementation.
+
+    Args:
+        name: A string describing the benchmark case
+        reference: A value in seconds for the reference implementation
+        optimized: A value in seconds for the optimized implementation
+    """
+    print('{:<32} reference: {:8.2f}ms  optimized: {:8.2f}ms  '
+          'speedup: {:6.1f}x'.format(name, reference * 1000,
+                                     optimized * 1000,
+                                     reference / optimized))
+
+######
+# REFERENCE IMPLEMENTATIONS
+#####
+
+
+def reference_price_lut(lines, fill=True):
+    """The original strptime/strftime based price LUT building loop.
+
+    Args:
+        lines: An array of CSV lines
+        fill: Whether or not to fill holidays/weekends
+
+    Returns:
+        A dictionary with dates as keys and prices as values
+    """
+    price_lookup = {}
+    for i in range(0, len(lines) - 1):
+        curr_line_data = lines[i].split(',')
+        next_line_data = lines[i + 1].split(',')
+        curr_date = datetime.datetime.strptime(
+            curr_line_data[0], DataManager.DATE_FORMAT)
+        next_date = datetime.datetime.strptime(
+            next_line_data[0], DataManager.DATE_FORMAT)
+        while curr_date < next_date:
+            price_lookup[curr_date.strftime(DataManager.DATE_FORMAT)] \
+                = float(curr_line_data[4])
+            if fill:
+                curr_date = curr_date + datetime.timedelta(1)
+            else:
+                curr_date = next_date
+    price_lookup[next_date.strftime(
+        DataManager.DATE_FORMAT)] = float(next_line_data[4])
+    return price_lookup
+
+
+def reference_sma(period, price_lut):
+    """The original SMA loop, summing a slice of the window per date.
+
+    Args:
+        period: A value representing a number of days
+        price_lut: A dictionary mapping dates to prices
+
+    Returns:
+        A dictionary with dates mapping to SMA values
+    """
+    sma = {}
+    period = int(period)
+    dates = sorted(price_lut.keys())
+    prices = []
+    for i, date in enumerate(dates):
+        prices.append(price_lut[date])
+        if i < period:
+            sma[date] = sum(prices) / len(prices)
+        else:
+            sma[date] = sum(prices[-period:]) / period
+    return sma
+
+######
+# BENCHMARKS
+#####
+
+
+def benchmark_price_lut(years=30):
+    """Compares building a filled price LUT from a daily file with the
+    original per-day date formatting loop.
+
+    Args:
+        years: (optional) A value for the number of years of data
+    """
+    with tempfile.TemporaryDirectory() as data_location:
+        db = DataManager(data_location + '/')
+        rows = write_synthetic_csv(data_location, 'BENCH', years)
+        lines = db._readlines_for('BENCH')
+        print('price LUT, {} years, {} rows'.format(years, rows))
+        for fill in [True, False]:
+            expected = {date_ordinal(date): price for (date, price)
+                        in reference_price_lut(lines, fill).items()}
+            if db._build_price_lut('BENCH', fill) != expected:
+                raise AssertionError('price LUTs differ (fill={})'.format(
+                    fill))
+            report('  fill={}'.format(fill),
+                   best_time(lambda: reference_price_lut(lines, fill)),
+                   best_time(lambda: db._build_price_lut('BENCH', fill)))
+
+
+def benchmark_sma(years=55, periods=(10, 50, 200, 500)):
+    """Compares the running sum SMA with the original loop, on a
+    filled price LUT.
+
+    Args:
+        years: (optional) A value for the number of years of data
+        periods: (optional) An array of SMA periods
+    """
+    with tempfile.TemporaryDirectory() as data_location:
+        db = DataManager(data_location + '/')
+        write_synthetic_csv(data_location, 'BENCH', years)
+        price_lut = db.build_price_lut('BENCH')
+    calc = Calculator()
+    print('SMA, {} days'.format(len(price_lut)))
+    for period in periods:
+        expected = reference_sma(period, price_lut)
+        sma = calc.get_sma(period, price_lut)
+        if (sma.keys() != expected.keys()
+                or any(abs(sma[date] - value) > 1e-9 * abs(value)
+                       for (date, value) in expected.items())):
+            raise AssertionError('SMAs differ (period={})'.format(period))
+        report('  period={}'.format(period),
+               best_time(lambda: reference_sma(period, price_lut)),
+               best_time(lambda: calc.get_sma(period, price_lut)))
+
+
+BENCHMARKS = {
+    'price_lut': benchmark_price_lut,
+    'sma': benchmark_sma
+}
+
+
+def main():
+    """Wrapper for main logic."""
+    args = parser.parse_args()
+    for name in args.benchmarks or sorted(BENCHMARKS.keys()):
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmarks for the backtester.')
+    parser.add_argument('benchmarks', nargs='*',
+                        help='the benchmark(s) to run, default: all, '
+                             'choices: ' + ', '.join(sorted(BENCHMARKS)))
+
+    main()
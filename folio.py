@@ -38,8 +38,9 @@ def main():
             (data, _) = calc.generate_theoretical_data(gen, src)
         else:
             data = db.build_price_lut(args.draw[0])
-        dates = [date_obj(date) for date in sorted(data.keys())]
-        prices = [data[date_str(date)] for date in dates]
+        ordinals = sorted(data.keys())
+        dates = [date_obj(date) for date in ordinals]
+        prices = [data[date] for date in ordinals]
         # indicators and plot counts
         if not args.indicators:
             args.indicators = []
@@ -81,10 +82,11 @@ def main():
         tgt_lut = db.build_price_lut(args.generate[0])
         src_lut = db.build_price_lut(args.generate[1])
         tgt_dates = [date_obj(d) for d in sorted(tgt_lut.keys())]
-        src_dates = [date_obj(d) for d in sorted(part.keys())]
-        tgt_gen_part_prices = [part[date_str(d)] for d in src_dates]
-        tgt_gen_full_prices = [full[date_str(d)] for d in src_dates]
-        src_prices = [src_lut[date_str(d)] for d in src_dates]
+        src_ordinals = sorted(part.keys())
+        src_dates = [date_obj(d) for d in src_ordinals]
+        tgt_gen_part_prices = [part[d] for d in src_ordinals]
+        tgt_gen_full_prices = [full[d] for d in src_ordinals]
+        src_prices = [src_lut[d] for d in src_ordinals]
 
         pyplot.subplot(211)
         pyplot.plot([date_obj(d) for d in tgt_dates],
@@ -105,6 +107,11 @@ def main():
     if args.portfolio:
         # init main objects
         my_market = Market()
+        my_market.use_data_manager(db)
+        if args.workers:
+            my_market.set_loaders(args.workers[0])
+        if args.trading_days:
+            my_market.use_trading_calendar(alignment=args.trading_days[0])
         my_portfolio = Portfolio()
         my_trader = Trader(args.portfolio[0], my_portfolio, my_market)
 
@@ -114,6 +121,13 @@ def main():
         my_sim.add_trader(my_trader)
         my_sim.use_market(my_market)
         my_sim.use_monitor(my_monitor)
+        if args.frequency:
+            my_sim.set_frequency(args.frequency[0])
+        if args.block_days:
+            my_sim.set_block_size(args.block_days[0])
+        if args.cache_indicators:
+            calc.use_indicator_cache()
+            my_sim.use_calculator(calc)
 
         (strategy, tickers, indicators) = db.build_strategy(args.strategy[0])
         my_trader.add_assets_of_interest(strategy['assets'])
@@ -136,6 +150,8 @@ def main():
 
         # run simulation
         my_sim.simulate()
+        for line in my_market.alignment.summary():
+            print('GAPS: ' + line)
 
         # print some stats
         print('##################################')
@@ -164,6 +180,10 @@ def main():
         print('max drawdown: {}%'.format(percent(drawdown['amount'])))
         print('  between {} and {}, recovered by {}'.format(
             drawdown['from'], drawdown['to'], drawdown['recovered_by']))
+        if my_sim.peak_memory:
+            print('---------------------------')
+            print('peak memory: {:.1f}MB'.format(
+                my_sim.peak_memory / 1024 / 1024))
 
         # show plots
         (x, y) = my_monitor.get_data_series('portfolio_values')
@@ -212,8 +232,21 @@ if __name__ == "__main__":
                         help='Use with --portfolio. Specify a frequency at which to rebalance.')
     parser.add_argument('--use-generated', nargs='+',
                         help='Use with --portfolio or --draw. Specify pairs of tickers, wherein the first of the pair will be generated based on the second. This will replace the data used in --draw or --portfolio.')
-
-    db = DataManager()
+    parser.add_argument('--workers', nargs=1, type=int,
+                        help='Use with --portfolio. Specify a number of stocks to load concurrently.')
+    parser.add_argument('--trading-days', nargs=1, choices=['intersection', 'ffill'],
+                        help='Use with --portfolio. Simulate trading days only, specifying how to align stocks without a price on a day: intersection (skip the day) or ffill (use the last price).')
+    parser.add_argument('--frequency', nargs=1, choices=['d', 'w', 'm', 'q'],
+                        help='Use with --portfolio. Simulate daily (d), weekly (w), monthly (m) or quarterly (q) bars, with indicators computed on the bars.')
+    parser.add_argument('--block-days', nargs=1, type=int,
+                        help='Use with --portfolio. Simulate this many days at a time, keeping only their prices in memory. Indicators must have a limited lookback, e.g. SMA.')
+    parser.add_argument('--cache-indicators', action='store_true',
+                        help='Use with --portfolio. Keep computed indicators on disk, so later runs on the same prices read them back.')
+    parser.add_argument('--backend', default='csv', choices=DataManager.BACKENDS,
+                        help='Specify how stock data is stored, default: csv')
+
+    db = DataManager(backend=parser.parse_args().backend)
     calc = Calculator()
+    calc.use_data_manager(db)
 
     main()
@@ -7,13 +7,24 @@ Todo:
     - [for fun, low priority] run benchmark on nearest_date_index
 """
 
+import calendar
 import datetime
 from datetime import datetime as dt
 import os
 import os.path
+import sys
+import threading
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
 
 STOCK_DIR = "data/"
 DATE_FORMAT = "%Y-%m-%d"
+DAY_STRS = ['{:02d}'.format(day) for day in range(32)]
 
 ######
 # CLASSES
@@ -119,10 +130,160 @@ class SteppedAvgLookup(object):
                 del self._lut[key]
 
 
+class SizedLRUCache(object):
+
+    """A least recently used cache bounded by the memory footprint of
+    its values rather than by the number of entries.
+
+    When adding a value would put the cache over its size limit, the
+    least recently used entries are evicted until it fits. A value
+    larger than the whole cache is not stored at all. The cache can be
+    used from multiple threads.
+
+    Attributes:
+        max_bytes: A value for the maximum total size of the values
+        size: A value for the current total size of the values
+        hits: A counter for lookups which found a value
+        misses: A counter for lookups which didn't find a value
+        evictions: A counter for entries evicted to make room
+    """
+
+    def __init__(self, max_bytes, sizeof=None):
+        """Initializes an empty cache.
+
+        Args:
+            max_bytes: A value for the maximum total size of the values
+            sizeof: (optional) A function returning the size of a value
+                in bytes, default: approx_sizeof
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizeof = sizeof or approx_sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        """Returns the number of entries in the cache."""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Returns whether the cache has an entry for a key, without
+        counting as a lookup."""
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Gets the value for a key and marks it as recently used.
+
+        Args:
+            key: A key to look up
+            default: (optional) A value to return for a miss
+
+        Returns:
+            The cached value, or default if there is none
+        """
+        with self._lock:
+            try:
+                (value, _) = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Adds a value to the cache, evicting old entries as needed.
+
+        Args:
+            key: A key for the value
+            value: A value to cache
+        """
+        size = self._sizeof(value)
+        with self._lock:
+            self.discard(key)
+            if size > self.max_bytes:
+                return
+            while self.size + size > self.max_bytes:
+                (_, (_, evicted_size)) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size)
+            self.size += size
+
+    def discard(self, key):
+        """Removes the entry for a key, if there is one.
+
+        Args:
+            key: A key to remove
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1]
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Returns the counters and footprint of this cache.
+
+        Returns:
+            A dictionary with entries, bytes, hits, misses and
+            evictions
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+
 ######
 # FUNCTIONS
 #####
 
+def approx_sizeof(obj):
+    """Approximates the memory footprint of an object, including the
+    contents of (nested) dictionaries, lists, tuples and sets.
+
+    Args:
+        obj: An object to measure
+
+    Returns:
+        A value representing a number of bytes
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_sizeof(key) + approx_sizeof(value)
+                    for (key, value) in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_sizeof(item) for item in obj)
+    return size
+
+
+def peak_memory():
+    """Returns the peak memory use (resident set size) of this
+    process so far.
+
+    Returns:
+        A value representing a number of bytes, or None where this
+        isn't available (e.g. on Windows)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
 def currency(number):
     """Nicer looking wrapper for converting to currency format.
 
@@ -152,16 +313,19 @@ def date_obj(date):
     date object.
 
     Args:
-        number: A date string or date/datetime object
+        number: A date string, date ordinal or date/datetime object
 
     Returns:
         A datetime object representing the given date
     """
     if type(date) is dt:
         return date
+    if type(date) is int:
+        return dt.fromordinal(date)
     if type(date) is datetime.date:
         return dt(date.year, date.month, date.day)
-    return dt.strptime(date, DATE_FORMAT)
+    # timestamps of intraday bars start with their date
+    return dt.fromisoformat(date[:10])
 
 
 def date_str(date):
@@ -169,26 +333,91 @@ def date_str(date):
     date object.
 
     Args:
-        number: A date string or date/datetime object
+        number: A date string, date ordinal or date/datetime object
 
     Returns:
         A date string representing the given date
     """
     if type(date) is str:
         return date
+    if type(date) is int:
+        return datetime.date.fromordinal(date).isoformat()
     return date.strftime(DATE_FORMAT)
 
+
+def date_ordinal(date):
+    """Returns the equivalent date ordinal for the given date or date
+    object, the compact representation used for dates internally.
+
+    Args:
+        date: A date string, date ordinal or date/datetime object
+
+    Returns:
+        An int counting days from 0001-01-01 (day 1)
+    """
+    if type(date) is int:
+        return date
+    if type(date) is str:
+        # timestamps of intraday bars start with their date
+        return datetime.date.fromisoformat(date[:10]).toordinal()
+    return date.toordinal()
+
+def date_strs_between(first, last):
+    """Returns the date strings for every day between two date
+    ordinals, inclusive.
+
+    Walks the calendar a month at a time and concatenates a 'YYYY-MM-'
+    prefix with precomputed day strings, so no date is formatted on
+    its own.
+
+    Args:
+        first: A date ordinal for the first day
+        last: A date ordinal for the last day
+
+    Returns:
+        An array of date strings in DATE_FORMAT, one per day
+    """
+    date_strs = []
+    date = datetime.date.fromordinal(first)
+    (year, month, day) = (date.year, date.month, date.day)
+    remaining = last - first + 1
+    while remaining > 0:
+        prefix = '{:04d}-{:02d}-'.format(year, month)
+        count = min(calendar.monthrange(year, month)[1] - day + 1, remaining)
+        date_strs.extend([prefix + day_str
+                          for day_str in DAY_STRS[day:day + count]])
+        remaining -= count
+        (year, month, day) = (year + month // 12, month % 12 + 1, 1)
+    return date_strs
+
+def date_strs_for(ordinals):
+    """Returns the date strings for a set of date ordinals.
+
+    Args:
+        ordinals: An array of date ordinals
+
+    Returns:
+        An array of date strings in DATE_FORMAT, aligned with ordinals
+    """
+    if not len(ordinals):
+        return []
+    first = min(ordinals)
+    date_strs = date_strs_between(first, max(ordinals))
+    return [date_strs[ordinal - first] for ordinal in ordinals]
+
 def days_between(date_a, date_b):
     """Returns the number of days between two dates.
 
     Args:
-        date_a: A date string or object representing the earlier date
-        date_b: A date string or object representing the later date
+        date_a: A date string, ordinal or object representing the
+            earlier date
+        date_b: A date string, ordinal or object representing the
+            later date
 
     Returns:
         A value representing a number of days
     """
-    return (date_obj(date_b) - date_obj(date_a)).days
+    return date_ordinal(date_b) - date_ordinal(date_a)
 
 def write_list_to_file(list, filename, overwrite):
     """Writes a list to a newline separated file.
@@ -262,6 +491,8 @@ def subtract_date(period, unit, date):
         datetime.timedelta(diffs['d'])
     if type(date) is str:
         return date_str(new_date)
+    if type(date) is int:
+        return new_date.toordinal()
     return new_date
 
 
@@ -317,29 +548,32 @@ def nearest_date_index(date, dates, direction):
     Returns:
         An index for the nearest date
     """
-    if len(dates) == 0 or date_str(dates[-1]) < date_str(date):
+    if len(dates) == 0:
+        return -1
+    target = date_ordinal(date)
+    first = date_ordinal(dates[0])
+    last = date_ordinal(dates[-1])
+    if last < target:
         return -1
-    if date_str(dates[0]) >= date_str(date):
+    if first >= target:
         return 0
-    last_date = date_obj(dates[-1])
-    first_date = date_obj(dates[0])
-    target_date = date_obj(date)
-    approx_factor = len(dates) / (last_date - first_date).days
-    i = int((target_date - first_date).days * approx_factor)
+    # only the dates probed are converted, so a lookup takes as many
+    # steps as the search does, not one per date
+    approx_factor = len(dates) / (last - first)
+    i = int((target - first) * approx_factor)
     if i > 0:
         i -= 1
-    if date_str(dates[i]) == date_str(date):
+    if date_ordinal(dates[i]) == target:
         return i
-    if date_str(dates[i]) < date_str(date):
-        while date_str(dates[i]) < date_str(date):
+    if date_ordinal(dates[i]) < target:
+        while date_ordinal(dates[i]) < target:
             i += 1
     else:
-        while date_str(dates[i - 1]) >= date_str(date):
+        while date_ordinal(dates[i - 1]) >= target:
             i -= 1
     if direction == 0:
         return min([i, i - 1],
-                   key=lambda x: abs((date_obj(dates[x])
-                                      - date_obj(date)).days))
+                   key=lambda x: abs(date_ordinal(dates[x]) - target))
     if direction < 0:
         return i - 1
     if direction > 0: